@@ -10,20 +10,22 @@ from dotenv import load_dotenv
 # Add parent directory to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 from src.distributed_agent import create_distributed_agent
-from src.distributed_indexer import DistributedCodeIndexer
 
 
 def build_index_if_missing(repo_path: str, output_dir: str, api_key: str, base_url: str):
     """Build distributed index if it doesn't exist."""
-    
+
     repo_index_path = os.path.join(output_dir, "repo_index.json")
-    
+
     if os.path.exists(repo_index_path):
         print(f"✓ Found existing index: {repo_index_path}")
         return
-    
+
+    # Import here so warm-index runs don't pay the indexer's import cost
+    from src.distributed_indexer import DistributedCodeIndexer
+
     print(f"Building distributed index for {repo_path}...")
-    
+
     indexer = DistributedCodeIndexer(
         api_key=api_key,
         base_url=base_url,
@@ -52,12 +54,10 @@ def main():
     
     if not api_key or not base_url:
         raise ValueError("OPENAI_API_KEY not found in .env file")
-    
-    # Set OpenAI API key for agent
-    os.environ['OPENAI_API_KEY'] = api_key
-    if base_url:
-        os.environ['OPENAI_BASE_URL'] = base_url
-    
+
+    # load_dotenv already exported OPENAI_API_KEY / OPENAI_BASE_URL, so no
+    # need to write them back into os.environ here
+
     # Paths
     repo_path = os.path.join(parent_dir, 'repo', 'openai-python')
     output_dir = os.path.join(parent_dir, 'output', 'distributed_index')
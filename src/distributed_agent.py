@@ -4,16 +4,31 @@ Works with distributed index structure (separate file per directory).
 """
 
 import os
+import re
 import json
+import mmap
+import time
+import select
+import asyncio
+import shlex
+import string
+import functools
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 from typing import TypedDict, Annotated, Sequence
-from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage, ToolMessage
 from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph, END
 from langgraph.graph.message import add_messages
 from langgraph.prebuilt import ToolNode
 from langchain_core.tools import tool
-from src.distributed_models import RepositoryIndex, DirectoryIndex
+from src.distributed_models import RepositoryIndex, DirectoryIndex, CodeElementType
 
 
 # ============================================================================
@@ -25,14 +40,618 @@ class AgentState(TypedDict):
     messages: Annotated[Sequence[BaseMessage], add_messages]
     files_investigated: list  # Track files that have been read
     iteration_count: int  # Track number of iterations
+    last_file_count: int  # Files investigated as of the previous iteration
+    stagnant_iterations: int  # Consecutive iterations that added no new files
+
+
+# ============================================================================
+# Index Cache
+# ============================================================================
+
+# Process-resident cache of parsed index files: absolute path -> (mtime, data).
+# Index files are read over and over while the agent navigates, so serving
+# them from memory avoids a fork+exec+read+parse per navigation step.
+_INDEX_CACHE: dict = {}
+
+# Matches "cat <...>index.json" with an optional "| jq '<filter>'" suffix
+_INDEX_CAT_RE = re.compile(
+    r"^\s*cat\s+(\S*index(?:\.json|_index\.json))"
+    r"(?:\s*\|\s*jq\s+'(.+)')?\s*$"
+)
+
+
+def _loads_json(data) -> dict:
+    """Parse JSON text/bytes, preferring orjson when available."""
+    if orjson is not None:
+        return orjson.loads(data)
+    if isinstance(data, bytes):
+        data = data.decode('utf-8')
+    return json.loads(data)
+
+
+def _dumps_json(obj) -> str:
+    """Serialize to indented JSON text, preferring orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2, default=str).decode('utf-8')
+    return json.dumps(obj, indent=2, default=str)
+
+
+@functools.lru_cache(maxsize=1024)
+def _abs_path(path: str) -> str:
+    """Cached os.path.abspath: index paths recur constantly across a query."""
+    return os.path.abspath(path)
+
+
+def _read_index(path: str) -> dict:
+    """Load a parsed index file, caching by path with mtime invalidation."""
+    abs_path = _abs_path(path)
+    mtime = os.path.getmtime(abs_path)
+    cached = _INDEX_CACHE.get(abs_path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with open(abs_path, 'rb') as f:
+        data = _loads_json(f.read())
+    _INDEX_CACHE[abs_path] = (mtime, data)
+    return data
+
+
+# Above this serialized size, index reads return the compact projection
+# instead of truncated JSON (truncated JSON forces a retry round-trip)
+_INDEX_COMPACT_THRESHOLD = 50000
+
+# element_type on the wire is the enum's declaration-order ordinal; indices
+# written before that change carry the string value, so accept either form
+_ELEMENT_TYPE_ORDINAL = {t: i for i, t in enumerate(CodeElementType)}
+_CLASS_KEYS = {CodeElementType.CLASS.value, _ELEMENT_TYPE_ORDINAL[CodeElementType.CLASS]}
+_FUNCTION_KEYS = {CodeElementType.FUNCTION.value, _ELEMENT_TYPE_ORDINAL[CodeElementType.FUNCTION]}
+
+
+def _compact_index_view(data: dict, index_path: str) -> dict:
+    """
+    Project an oversized directory index to a compact structured view.
+
+    Truncating JSON mid-document forces the LLM to retry with a narrower
+    jq filter; a structured projection keeps every file visible in one
+    reply at a fraction of the size.
+    """
+    files = data.get('files', [])
+    subdirs = data.get('subdirectories', [])
+
+    compact_files = []
+    for f in files:
+        elements = f.get('elements', [])
+        compact_files.append({
+            'relative_path': f.get('relative_path', ''),
+            'summary': f.get('summary'),
+            'total_lines': f.get('total_lines', 0),
+            'classes': sum(1 for e in elements if e.get('element_type') in _CLASS_KEYS),
+            'functions': sum(1 for e in elements if e.get('element_type') in _FUNCTION_KEYS),
+        })
+
+    return {
+        'note': (
+            'Directory index too large for full output; this is a compact view. '
+            f"For full metadata of one file use: cat {index_path} | jq "
+            "'.files[] | select(.relative_path == \"<path>\")'"
+        ),
+        'relative_path': data.get('relative_path'),
+        'summary': data.get('summary'),
+        'total_files': len(files),
+        'total_subdirectories': len(subdirs),
+        'files': compact_files,
+        'subdirectories': [
+            {
+                'relative_path': s.get('relative_path', ''),
+                'summary': s.get('summary'),
+                'file_count': s.get('file_count', 0),
+            }
+            for s in subdirs
+        ],
+    }
+
+
+def _serve_index_read(command: str):
+    """
+    Short-circuit "cat .../index.json [| jq '...']" commands from the cache.
+
+    Returns the stdout-equivalent text, or None if the command is not an
+    index read (caller falls back to subprocess execution).
+    """
+    match = _INDEX_CAT_RE.match(command)
+    if not match:
+        return None
+
+    index_path, jq_filter = match.groups()
+    if not os.path.isfile(index_path):
+        return None
+
+    try:
+        data = _read_index(index_path)
+        index_text = _dumps_json(data)
+        if (jq_filter is None and len(index_text) > _INDEX_COMPACT_THRESHOLD
+                and ('files' in data or 'subdirectories' in data)):
+            index_text = _dumps_json(_compact_index_view(data, index_path))
+    except (OSError, ValueError):
+        return None
+
+    if jq_filter:
+        # Still run jq for full filter semantics, but feed it the cached
+        # text via stdin so the file is not re-read and re-parsed.
+        try:
+            result = subprocess.run(
+                ['jq', jq_filter],
+                input=index_text,
+                capture_output=True,
+                text=True,
+                timeout=30
+            )
+            return result.stdout if result.stdout else result.stderr
+        except (OSError, subprocess.TimeoutExpired):
+            return None
+
+    return index_text
+
+
+# ============================================================================
+# In-Memory Search Index
+# ============================================================================
+
+# Flat table of file entries aggregated from every directory index, built
+# once at agent init. Keyword searches hit this table directly instead of
+# re-reading and re-parsing index files through cat | jq subprocesses.
+_FILE_TABLE: list = []
+
+
+def _build_file_table(index_root_dir: str) -> int:
+    """Walk the distributed index once and flatten all file entries."""
+    global _FILE_TABLE
+
+    table = []
+    for dirpath, dirnames, filenames in os.walk(index_root_dir):
+        if 'index.json' not in filenames:
+            continue
+        try:
+            data = _read_index(os.path.join(dirpath, 'index.json'))
+        except (OSError, ValueError):
+            continue
+        for file_entry in data.get('files', []):
+            table.append({
+                'relative_path': file_entry.get('relative_path', ''),
+                'file_path': file_entry.get('file_path', ''),
+                'summary': file_entry.get('summary') or '',
+                'total_lines': file_entry.get('total_lines', 0),
+                'elements': [e.get('name', '') for e in file_entry.get('elements', [])],
+            })
+
+    _FILE_TABLE = table
+    return len(table)
+
+
+@tool
+def search_index(keyword: str, field: str = "any") -> str:
+    """
+    Search the pre-loaded file index for a keyword (case-insensitive).
+
+    Much faster than cat index.json | jq: the whole distributed index is
+    already flattened in memory. Use this FIRST to find candidate files,
+    then read them with bash/bash_batch.
+
+    Args:
+        keyword: Keyword to search for (e.g. "auth", "client", "streaming")
+        field: Where to search: "path", "summary", "element", or "any"
+
+    Returns:
+        JSON list of matching files (relative_path, summary, total_lines, elements)
+    """
+    if not _FILE_TABLE:
+        return "Error: Search index not loaded. Use bash with cat/jq on index files instead."
+
+    needle = keyword.lower()
+    matches = []
+    for entry in _FILE_TABLE:
+        if field in ("path", "any") and needle in entry['relative_path'].lower():
+            matches.append(entry)
+            continue
+        if field in ("summary", "any") and needle in entry['summary'].lower():
+            matches.append(entry)
+            continue
+        if field in ("element", "any") and any(needle in name.lower() for name in entry['elements']):
+            matches.append(entry)
+
+    if not matches:
+        return f"No files matching '{keyword}' in field '{field}'"
+
+    result = _dumps_json(matches[:25])
+    if len(matches) > 25:
+        result += f"\n... ({len(matches) - 25} more matches, narrow the keyword)"
+    return result
+
+
+# ============================================================================
+# In-Process Command Execution
+# ============================================================================
+
+class _BuiltinUnsupported(Exception):
+    """Raised when a builtin cannot handle a command; caller falls back to subprocess."""
+    pass
+
+
+def _builtin_cat(args: list, stdin):
+    """In-process implementation of cat."""
+    if any(arg.startswith('-') for arg in args):
+        raise _BuiltinUnsupported()
+    if not args:
+        return stdin or ""
+    parts = []
+    for path in args:
+        if not os.path.isfile(path):
+            return f"cat: {path}: No such file or directory"
+        with open(path, 'r', errors='replace') as f:
+            parts.append(f.read())
+    return ''.join(parts)
+
+
+def _builtin_head(args: list, stdin):
+    """In-process implementation of head (supports -n N)."""
+    num_lines = 10
+    paths = []
+    i = 0
+    while i < len(args):
+        if args[i] == '-n' and i + 1 < len(args):
+            num_lines = int(args[i + 1])
+            i += 2
+        elif args[i].startswith('-') and args[i][1:].isdigit():
+            num_lines = int(args[i][1:])
+            i += 1
+        elif args[i].startswith('-'):
+            raise _BuiltinUnsupported()
+        else:
+            paths.append(args[i])
+            i += 1
+    if paths:
+        text = _builtin_cat(paths, None)
+    else:
+        text = stdin or ""
+    return '\n'.join(text.splitlines()[:num_lines]) + '\n' if text else ""
+
+
+# Extensions treated as searchable text for the recursive grep path
+_GREP_TEXT_EXTENSIONS = frozenset({
+    '.py', '.md', '.json', '.yaml', '.yml', '.toml', '.txt', '.cfg', '.ini', '.rst'
+})
+
+# Directories skipped during recursive grep
+_GREP_SKIP_DIRS = frozenset({'node_modules', '__pycache__', 'venv', '.venv', 'dist', 'build'})
+
+_GREP_MAX_MATCHES = 2000
+
+
+def _grep_mmapped_file(regex, path: str, prefix: str, matches: list) -> bool:
+    """
+    Scan one file via mmap, appending matching lines to `matches`.
+
+    Returns False once the global match cap is reached.
+    """
+    try:
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return True
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                last_line_start = -1
+                for match in regex.finditer(mm):
+                    line_start = mm.rfind(b'\n', 0, match.start()) + 1
+                    if line_start == last_line_start:
+                        continue  # One output line per matching line
+                    last_line_start = line_start
+                    line_end = mm.find(b'\n', match.end())
+                    if line_end == -1:
+                        line_end = len(mm)
+                    line = mm[line_start:line_end].decode('utf-8', errors='replace')
+                    matches.append(prefix + line)
+                    if len(matches) >= _GREP_MAX_MATCHES:
+                        return False
+    except (OSError, ValueError):
+        pass
+    return True
+
+
+def _grep_recursive(regex, root: str, matches: list):
+    """Walk `root` and grep text files in-process (page-cache friendly)."""
+    stack = [root]
+    while stack:
+        current = stack.pop()
+        try:
+            entries = sorted(os.scandir(current), key=lambda e: e.name)
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.name.startswith('.') or entry.name in _GREP_SKIP_DIRS:
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                if os.path.splitext(entry.name)[1] not in _GREP_TEXT_EXTENSIONS:
+                    continue
+                if not _grep_mmapped_file(regex, entry.path, f"{entry.path}:", matches):
+                    return
+
+
+def _builtin_grep(args: list, stdin):
+    """In-process implementation of grep (supports -i, -r, stdin or file args)."""
+    ignore_case = False
+    recursive = False
+    pattern = None
+    paths = []
+    for arg in args:
+        if arg == '-i':
+            ignore_case = True
+        elif arg in ('-r', '-R', '-ri', '-ir'):
+            recursive = True
+            ignore_case = ignore_case or 'i' in arg
+        elif arg.startswith('-'):
+            raise _BuiltinUnsupported()
+        elif pattern is None:
+            pattern = arg
+        else:
+            paths.append(arg)
+    if pattern is None:
+        raise _BuiltinUnsupported()
+
+    flags = re.IGNORECASE if ignore_case else 0
+    matches = []
+
+    if recursive:
+        # mmap + bytes regex over the tree, avoiding a system grep fork
+        try:
+            regex = re.compile(pattern.encode('utf-8'), flags)
+        except re.error:
+            raise _BuiltinUnsupported()
+        for path in (paths or ['.']):
+            if os.path.isdir(path):
+                _grep_recursive(regex, path, matches)
+            elif os.path.isfile(path):
+                _grep_mmapped_file(regex, path, f"{path}:", matches)
+            else:
+                return f"grep: {path}: No such file or directory"
+        if len(matches) >= _GREP_MAX_MATCHES:
+            matches.append(f"... (stopped after {_GREP_MAX_MATCHES} matches, narrow the pattern)")
+        return '\n'.join(matches) + '\n' if matches else ""
+
+    try:
+        regex = re.compile(pattern, flags)
+    except re.error:
+        raise _BuiltinUnsupported()
+
+    if paths:
+        for path in paths:
+            if not os.path.isfile(path):
+                return f"grep: {path}: No such file or directory"
+            with open(path, 'r', errors='replace') as f:
+                for line in f:
+                    if regex.search(line):
+                        prefix = f"{path}:" if len(paths) > 1 else ""
+                        matches.append(prefix + line.rstrip('\n'))
+    else:
+        for line in (stdin or "").splitlines():
+            if regex.search(line):
+                matches.append(line)
+    return '\n'.join(matches) + '\n' if matches else ""
+
+
+_BUILTINS = {
+    "cat": _builtin_cat,
+    "head": _builtin_head,
+    "grep": _builtin_grep,
+}
+
+
+def _run_in_process(command: str):
+    """
+    Execute a command pipeline in-process when every stage is a known builtin.
+
+    Returns the stdout-equivalent text, or None when any stage needs a real
+    shell (caller falls back to subprocess).
+    """
+    try:
+        # punctuation_chars makes an unquoted '|' its own token even with no
+        # surrounding whitespace (cat f.json|jq .); a quoted pipe stays part
+        # of its word, as the shell would treat it
+        lexer = shlex.shlex(command, posix=True, punctuation_chars='|')
+        lexer.whitespace_split = True
+        tokens = list(lexer)
+    except ValueError:
+        return None
+
+    # Split the token stream into pipeline stages on '|'
+    stages = [[]]
+    for token in tokens:
+        if token == '|':
+            stages.append([])
+        else:
+            stages[-1].append(token)
+
+    if any(not stage for stage in stages):
+        return None
+    if any(stage[0] not in _BUILTINS for stage in stages):
+        return None
+
+    stdin = None
+    try:
+        for stage in stages:
+            stdin = _BUILTINS[stage[0]](stage[1:], stdin)
+    except (_BuiltinUnsupported, OSError, ValueError):
+        return None
+    return stdin
+
+
+# Output cap applied at the tool boundary; subprocess reads stop producing
+# shortly past it instead of buffering everything first
+_OUTPUT_LIMIT = 50000
+
+
+def _run_subprocess(command: str) -> str:
+    """
+    Execute a command via the shell, truncating on the producer side.
+
+    Reads stdout in 64KB chunks and terminates the process once the output
+    cap is exceeded, instead of letting capture_output buffer megabytes
+    that get sliced away afterwards.
+    """
+    proc = subprocess.Popen(
+        command,
+        shell=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        cwd=os.getcwd()
+    )
+    deadline = time.monotonic() + 30  # Increased timeout for thorough research
+    stdout_fd = proc.stdout.fileno()
+    stderr_fd = proc.stderr.fileno()
+    chunks = []
+    err_chunks = []
+    total = err_total = 0
+    truncated = False
+    open_fds = {stdout_fd, stderr_fd}
+
+    try:
+        while open_fds:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                proc.kill()
+                proc.wait()
+                raise subprocess.TimeoutExpired(command, 30)
+            ready, _, _ = select.select(list(open_fds), [], [], remaining)
+            if not ready:
+                continue
+            for fd in ready:
+                chunk = os.read(fd, 65536)
+                if not chunk:
+                    open_fds.discard(fd)
+                elif fd == stderr_fd:
+                    # Always drained: a full stderr pipe blocks the producer
+                    # until the timeout. Kept only up to the cap
+                    if err_total <= _OUTPUT_LIMIT:
+                        err_chunks.append(chunk)
+                        err_total += len(chunk)
+                elif not truncated:
+                    chunks.append(chunk)
+                    total += len(chunk)
+                    if total > _OUTPUT_LIMIT:
+                        truncated = True
+                        proc.terminate()
+        try:
+            proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+
+        stdout = b''.join(chunks).decode('utf-8', errors='replace')
+        if stdout:
+            return stdout
+        if truncated:
+            return ""
+        return b''.join(err_chunks).decode('utf-8', errors='replace')
+    finally:
+        proc.stdout.close()
+        proc.stderr.close()
+
+
+def _execute_command(command: str) -> str:
+    """Execute a command, preferring the index cache and in-process builtins."""
+    cached_output = _serve_index_read(command)
+    if cached_output is not None:
+        return cached_output
+
+    in_process_output = _run_in_process(command)
+    if in_process_output is not None:
+        return in_process_output
+
+    return _run_subprocess(command)
 
 
 # ============================================================================
 # Bash Tool
 # ============================================================================
 
-# Global state for tracking files (will be updated by tool)
-_files_investigated = []
+# Security: restrict to safe commands. Matches dangerous commands only at
+# word boundaries (so 'grep' is no longer rejected for containing 'cp', and
+# paths containing 'mv' pass), plus shell redirection/chaining metacharacters.
+# Whitespace in the prefix class covers newlines ("ls\nrm -rf x") and
+# argument position ("ls | xargs rm"), which shell metacharacters alone miss
+_DANGEROUS_RE = re.compile(
+    r'(?:^|[;\s|&(`])(?:rm|mv|cp|chmod|chown|sudo|su)(?:\s|$)'
+    r'|>>?|&&|\|\|'
+)
+
+
+def _check_command_safety(command: str):
+    """Return an error message if the command is restricted, else None."""
+    match = _DANGEROUS_RE.search(command)
+    if match:
+        return f"Error: Command contains restricted operation: {match.group(0).strip()}"
+    return None
+
+
+# Files the agent has read via cat, per query context. A ContextVar (rather
+# than module state) keeps concurrent queries from sharing one mutable dict;
+# the dict doubles as an insertion-ordered set
+_investigated_files: ContextVar = ContextVar('_investigated_files', default=None)
+
+
+def _get_investigated_files() -> list:
+    """Files read so far in this query context, in first-read order."""
+    files = _investigated_files.get()
+    return list(files) if files else []
+
+
+def _reset_investigated_files():
+    """Start tracking afresh for a new query."""
+    _investigated_files.set({})
+
+
+def _track_investigated_files(command: str):
+    """Record code files read via cat commands."""
+    if 'cat ' not in command or '.py' not in command or 'index.json' in command:
+        return
+
+    files = _investigated_files.get()
+    if files is None:
+        files = {}
+        _investigated_files.set(files)
+
+    # Extract file path from cat command (shlex handles quoted paths)
+    try:
+        parts = shlex.split(command)
+    except ValueError:
+        parts = command.split()
+    for i, part in enumerate(parts):
+        if part == 'cat' and i + 1 < len(parts):
+            files.setdefault(parts[i + 1], None)
+
+
+def _run_command(command: str) -> str:
+    """Run a single command with safety checks, tracking, and truncation."""
+    try:
+        error = _check_command_safety(command)
+        if error:
+            return error
+
+        _track_investigated_files(command)
+
+        # Execute command (index cache / in-process builtins / subprocess)
+        output = _execute_command(command)
+
+        # Limit output size but allow larger outputs for thorough research
+        if len(output) > _OUTPUT_LIMIT:
+            output = output[:_OUTPUT_LIMIT] + "\n... (output truncated, use grep or sed for specific sections)"
+
+        return output if output else "Command executed successfully (no output)"
+
+    except subprocess.TimeoutExpired:
+        return "Error: Command timed out after 30 seconds"
+    except Exception as e:
+        return f"Error executing command: {str(e)}"
+
 
 @tool
 def bash(command: str) -> str:
@@ -54,178 +673,74 @@ def bash(command: str) -> str:
     Returns:
         Command output or error message
     """
-    global _files_investigated
-    
-    try:
-        # Security: restrict to safe commands
-        dangerous_commands = ['rm', 'mv', 'cp', 'chmod', 'chown', 'sudo', 'su', '>', '>>', '&&', '||']
-        for dangerous in dangerous_commands:
-            if dangerous in command:
-                return f"Error: Command contains restricted operation: {dangerous}"
-        
-        # Track files being read
-        if 'cat ' in command and '.py' in command and 'index.json' not in command:
-            # Extract file path from cat command
-            parts = command.split()
-            for i, part in enumerate(parts):
-                if part == 'cat' and i + 1 < len(parts):
-                    file_path = parts[i + 1]
-                    if file_path not in _files_investigated:
-                        _files_investigated.append(file_path)
-        
-        # Execute command
-        result = subprocess.run(
-            command,
-            shell=True,
-            capture_output=True,
-            text=True,
-            timeout=30,  # Increased timeout for thorough research
-            cwd=os.getcwd()
-        )
-        
-        output = result.stdout if result.stdout else result.stderr
-        
-        # Limit output size but allow larger outputs for thorough research
-        if len(output) > 50000:
-            output = output[:50000] + "\n... (output truncated, use grep or sed for specific sections)"
-        
-        return output if output else "Command executed successfully (no output)"
-        
-    except subprocess.TimeoutExpired:
-        return "Error: Command timed out after 30 seconds"
-    except Exception as e:
-        return f"Error executing command: {str(e)}"
+    return _run_command(command)
+
+
+@tool
+def bash_batch(commands: list) -> str:
+    """
+    Execute multiple bash commands in one call and return all outputs.
+
+    Use this instead of repeated bash calls when the commands are known
+    up front, e.g. reading several files listed by a directory index:
+    bash_batch(["cat /path/a.py", "cat /path/b.py", "cat /path/c.py"])
+
+    Args:
+        commands: List of bash commands to execute (max 20)
+
+    Returns:
+        Concatenated outputs, each prefixed with a ===CMD=== delimiter
+    """
+    if not commands:
+        return "Error: No commands provided"
+
+    batch = commands[:20]
+
+    # Track files here in the calling context: ContextVars do not propagate
+    # into executor worker threads (tracking in _run_command is idempotent)
+    for command in batch:
+        _track_investigated_files(command)
+
+    # Commands are independent reads, so run them concurrently; executor.map
+    # preserves input order for the delimited output blocks.
+    with ThreadPoolExecutor(max_workers=min(len(batch), os.cpu_count() or 4)) as executor:
+        results = list(executor.map(_run_command, batch))
+
+    outputs = [
+        f"===CMD {i}: {command}===\n{output}"
+        for i, (command, output) in enumerate(zip(batch, results), 1)
+    ]
+
+    if len(commands) > 20:
+        outputs.append(f"... ({len(commands) - 20} commands skipped, max 20 per batch)")
+
+    return '\n'.join(outputs)
 
 
 # ============================================================================
-# Distributed Code Agent
+# System Prompt Template
 # ============================================================================
 
-class DistributedCodeAgent:
-    """
-    Code agent that uses distributed index structure.
-    Each directory has its own index file.
-    """
-    
-    def __init__(
-        self,
-        repo_index: RepositoryIndex,
-        index_root_dir: str,
-        model: str = "gpt-4o",
-        verbose: bool = True
-    ):
-        """
-        Initialize distributed code agent.
-        
-        Args:
-            repo_index: Repository index
-            index_root_dir: Root directory containing distributed index
-            model: OpenAI model to use
-            verbose: Whether to print reasoning steps
-        """
-        self.repo_index = repo_index
-        self.index_root_dir = os.path.abspath(index_root_dir)
-        self.model = model
-        self.verbose = verbose
-        
-        # Initialize LLM
-        self.llm = ChatOpenAI(model=model, temperature=0)
-        
-        # Define tools (only bash)
-        self.tools = [bash]
-        
-        # Bind tools to LLM
-        self.llm_with_tools = self.llm.bind_tools(self.tools)
-        
-        # Build graph
-        self.graph = self._build_graph()
-    
-    def _build_graph(self) -> StateGraph:
-        """Build the agent graph."""
-        
-        workflow = StateGraph(AgentState)
-        
-        # Add nodes
-        workflow.add_node("agent", self._agent_node)
-        workflow.add_node("tools", ToolNode(self.tools))
-        
-        # Set entry point
-        workflow.set_entry_point("agent")
-        
-        # Add conditional edges
-        workflow.add_conditional_edges(
-            "agent",
-            self._should_continue,
-            {
-                "continue": "tools",
-                "end": END
-            }
-        )
-        
-        # Add edge from tools back to agent
-        workflow.add_edge("tools", "agent")
-        
-        return workflow.compile()
-    
-    def _agent_node(self, state: AgentState) -> AgentState:
-        """Agent reasoning node with research tracking."""
-        messages = state["messages"]
-        iteration_count = state.get("iteration_count", 0) + 1
-        files_investigated = state.get("files_investigated", [])
-        
-        # Add research progress reminder every few iterations
-        if iteration_count > 0 and iteration_count % 5 == 0:
-            progress_msg = HumanMessage(content=f"""
-RESEARCH PROGRESS CHECK (Iteration {iteration_count}):
-- Files investigated so far: {len(files_investigated)}
-- Files: {', '.join(files_investigated[-10:]) if files_investigated else 'None yet'}
-
-REMINDER: Have you investigated enough files? 
-- Simple questions need 5-10 files minimum
-- Complex questions need 10-20 files minimum
-
-If you haven't reached the minimum, continue investigating more files.
-If you have enough information, you may provide your comprehensive answer.
-""")
-            messages = list(messages) + [progress_msg]
-        
-        response = self.llm_with_tools.invoke(messages)
-        
-        return {
-            "messages": [response],
-            "iteration_count": iteration_count,
-            "files_investigated": files_investigated
-        }
-    
-    def _should_continue(self, state: AgentState) -> str:
-        """Determine if agent should continue or end."""
-        messages = state["messages"]
-        last_message = messages[-1]
-        
-        if hasattr(last_message, "tool_calls") and last_message.tool_calls:
-            return "continue"
-        return "end"
-    
-    def _create_system_prompt(self) -> str:
-        """Create system prompt with hierarchical distributed index information."""
-        
-        return f"""You are a code research agent with access to a HIERARCHICAL DISTRIBUTED code index.
+# The static system prompt, kept at module level as a string.Template so
+# per-agent construction is a single substitute() call instead of an
+# f-string rebuild with ~25 interpolations.
+_SYSTEM_PROMPT_TMPL = string.Template("""You are a code research agent with access to a HIERARCHICAL DISTRIBUTED code index.
 
 HIERARCHICAL INDEX STRUCTURE:
 The code repository is indexed with a HIERARCHICAL FOLDER STRUCTURE that MIRRORS the code repository:
 
-1. Repository Index: {self.index_root_dir}/repo_index.json
+1. Repository Index: ${root}/repo_index.json
    - Contains repository metadata and reference to root directory index
    - Use this to understand overall repository structure
    
 2. Directory Indices: HIERARCHICAL STRUCTURE (mirrors code repo)
-   - Root directory: {self.index_root_dir}/index.json
-   - Subdirectories: {self.index_root_dir}/{{path}}/index.json
+   - Root directory: ${root}/index.json
+   - Subdirectories: ${root}/{path}/index.json
    - Examples:
-     * Root: {self.index_root_dir}/index.json
-     * src/: {self.index_root_dir}/src/index.json
-     * src/openai/: {self.index_root_dir}/src/openai/index.json
-     * src/openai/resources/: {self.index_root_dir}/src/openai/resources/index.json
+     * Root: ${root}/index.json
+     * src/: ${root}/src/index.json
+     * src/openai/: ${root}/src/openai/index.json
+     * src/openai/resources/: ${root}/src/openai/resources/index.json
    
    Each index.json contains:
      * File metadata (INLINE, full details including summaries and code elements)
@@ -245,21 +760,21 @@ The repo_index.json contains PRE-COMPUTED statistics that you should use DIRECTL
 - total_methods: Total number of methods
 
 For questions about counts/statistics, ALWAYS check repo_index.json FIRST:
-cat {self.index_root_dir}/repo_index.json | jq '.total_classes'
+cat ${root}/repo_index.json | jq '.total_classes'
 
 DO NOT use grep to count classes/functions - the statistics are already computed!
 
 NAVIGATION STRATEGY:
 1. Start with repo_index.json to understand structure AND get statistics:
-   cat {self.index_root_dir}/repo_index.json
+   cat ${root}/repo_index.json
 
 2. Load root directory index:
-   cat {self.index_root_dir}/index.json
+   cat ${root}/index.json
    
 3. Navigate to subdirectories by following the hierarchical path:
-   - To explore src/: cat {self.index_root_dir}/src/index.json
-   - To explore src/openai/: cat {self.index_root_dir}/src/openai/index.json
-   - To explore src/openai/resources/: cat {self.index_root_dir}/src/openai/resources/index.json
+   - To explore src/: cat ${root}/src/index.json
+   - To explore src/openai/: cat ${root}/src/openai/index.json
+   - To explore src/openai/resources/: cat ${root}/src/openai/resources/index.json
    
 4. Each directory index shows:
    - Files in that directory (INLINE with full metadata)
@@ -276,29 +791,29 @@ NAVIGATION STRATEGY:
 EXAMPLE WORKFLOW FOR STATISTICS:
 Question: "How many classes does this repo have?"
 # Step 1: Read pre-computed statistics from repo_index.json
-cat {self.index_root_dir}/repo_index.json | jq '.total_classes'
+cat ${root}/repo_index.json | jq '.total_classes'
 # Answer: Use the value directly (e.g., 928)
 
 Question: "How many lines of code?"
 # Step 1: Read pre-computed statistics
-cat {self.index_root_dir}/repo_index.json | jq '.total_lines'
+cat ${root}/repo_index.json | jq '.total_lines'
 # Answer: Use the value directly
 
 EXAMPLE WORKFLOW FOR CODE EXPLORATION:
 # Step 1: Understand repository
-cat {self.index_root_dir}/repo_index.json
+cat ${root}/repo_index.json
 
 # Step 2: See top-level structure (root directory)
-cat {self.index_root_dir}/index.json
+cat ${root}/index.json
 
 # Step 3: Navigate to src directory
-cat {self.index_root_dir}/src/index.json
+cat ${root}/src/index.json
 
 # Step 4: Navigate to src/openai directory
-cat {self.index_root_dir}/src/openai/index.json
+cat ${root}/src/openai/index.json
 
 # Step 5: Find files in directory (inline in index)
-cat {self.index_root_dir}/src/openai/index.json | jq '.files[] | select(.relative_path | contains("client"))'
+cat ${root}/src/openai/index.json | jq '.files[] | select(.relative_path | contains("client"))'
 
 # Step 6: Read actual code
 cat /path/to/src/openai/_client.py
@@ -356,17 +871,23 @@ RESEARCH DEPTH REQUIREMENTS:
 
 RESEARCH STRATEGIES:
 
+Strategy 0: Batch Known Commands
+- When you already know multiple files to read (e.g., after a jq listing),
+  use bash_batch to read them ALL in ONE tool call instead of one bash call per file
+- Example: bash_batch(["cat /path/a.py", "cat /path/b.py", "cat /path/c.py"])
+
 Strategy 1: Keyword Expansion
-- Search with multiple related terms
-- Example: cat {self.index_root_dir}/src/openai/index.json | jq '.files[] | select(.summary | contains("auth") or contains("login") or contains("credential"))'
+- Search with multiple related terms using the search_index tool (instant, searches ALL directories at once)
+- Example: search_index("auth"), search_index("login"), search_index("credential")
+- Fall back to jq for complex filters: cat ${root}/src/openai/index.json | jq '.files[] | select(.summary | contains("auth") or contains("login") or contains("credential"))'
 
 Strategy 2: Directory Exploration
 - Find all files in relevant directories
-- Example: cat {self.index_root_dir}/src/openai/resources/index.json | jq '.files[]'
+- Example: cat ${root}/src/openai/resources/index.json | jq '.files[]'
 
 Strategy 3: Dependency Following
 - When you see imports, investigate them
-- Example: Found "from _auth import AuthHandler" → cat {self.index_root_dir}/src/openai/index.json | jq '.files[] | select(.relative_path | contains("_auth"))'
+- Example: Found "from _auth import AuthHandler" → cat ${root}/src/openai/index.json | jq '.files[] | select(.relative_path | contains("_auth"))'
 
 Strategy 4: Usage Pattern Analysis
 - Find where a class/function is used
@@ -381,15 +902,12 @@ Strategy 5: Hierarchical Investigation
 EXAMPLE DEEP RESEARCH:
 Question: "How does authentication work?"
 
-Step 1: Broad search in multiple directories
-cat {self.index_root_dir}/index.json | jq '.subdirectories[] | select(.summary | contains("auth"))'
-cat {self.index_root_dir}/src/openai/index.json | jq '.files[] | select(.summary | contains("auth"))'
+Step 1: Broad search across ALL directories at once
+search_index("auth")
+search_index("credential")
 
-Step 2: Read ALL relevant files
-cat /path/to/_client.py
-cat /path/to/_auth.py
-cat /path/to/_credentials.py
-cat /path/to/_api_key.py
+Step 2: Read ALL relevant files in one batch
+bash_batch(["cat /path/to/_client.py", "cat /path/to/_auth.py", "cat /path/to/_credentials.py", "cat /path/to/_api_key.py"])
 ... (continue until 10-20 files)
 
 Step 3: Follow dependencies
@@ -414,9 +932,210 @@ QUALITY CHECKLIST BEFORE ANSWERING:
 
 If you answer NO to any of these, DO MORE RESEARCH before answering.
 
-Remember: DEPTH and THOROUGHNESS are more important than speed. Take time to investigate comprehensively.
+Remember: DEPTH and THOROUGHNESS are more important than speed. Take time to investigate comprehensively.""")
+
+
+# ============================================================================
+# Distributed Code Agent
+# ============================================================================
+
+class DistributedCodeAgent:
+    """
+    Code agent that uses distributed index structure.
+    Each directory has its own index file.
+    """
+    
+    def __init__(
+        self,
+        repo_index: RepositoryIndex,
+        index_root_dir: str,
+        model: str = "gpt-4o",
+        verbose: bool = True
+    ):
+        """
+        Initialize distributed code agent.
+        
+        Args:
+            repo_index: Repository index
+            index_root_dir: Root directory containing distributed index
+            model: OpenAI model to use
+            verbose: Whether to print reasoning steps
+        """
+        self.repo_index = repo_index
+        self.index_root_dir = os.path.abspath(index_root_dir)
+        self.model = model
+        self.verbose = verbose
 
-REPOSITORY INFORMATION:
+        # Iteration bounds: a hard recursion limit (env-overridable) plus an
+        # early stop once research stops surfacing new files
+        self.recursion_limit = int(os.getenv("AGENT_RECURSION_LIMIT", "40"))
+        self.max_stagnant_iterations = 3
+        
+        # Initialize LLM
+        self.llm = ChatOpenAI(model=model, temperature=0)
+        
+        # Build the flat in-memory search table over all directory indices
+        _build_file_table(self.index_root_dir)
+
+        # Define tools
+        self.tools = [bash, bash_batch, search_index]
+        
+        # Bind tools to LLM
+        self.llm_with_tools = self.llm.bind_tools(self.tools)
+        
+        # Build graph
+        self.graph = self._build_graph()
+
+        # All values interpolated into the prompts are immutable after
+        # construction, so build the messages once and reuse across queries
+        self._system_prompt = SystemMessage(content=self._create_system_prompt())
+        self._repo_info_prompt = SystemMessage(content=self._create_repo_info_prompt())
+    
+    def _build_graph(self) -> StateGraph:
+        """Build the agent graph."""
+        
+        workflow = StateGraph(AgentState)
+        
+        # Add nodes
+        workflow.add_node("agent", self._agent_node)
+        workflow.add_node("tools", ToolNode(self.tools))
+        
+        # Set entry point
+        workflow.set_entry_point("agent")
+        
+        # Add conditional edges
+        workflow.add_conditional_edges(
+            "agent",
+            self._should_continue,
+            {
+                "continue": "tools",
+                "end": END
+            }
+        )
+        
+        # Add edge from tools back to agent
+        workflow.add_edge("tools", "agent")
+        
+        return workflow.compile()
+    
+    def _agent_node(self, state: AgentState) -> AgentState:
+        """Agent reasoning node with research tracking."""
+        messages = state["messages"]
+        iteration_count = state.get("iteration_count", 0) + 1
+        files_investigated = _get_investigated_files()
+
+        # Detect stalled research: consecutive iterations adding no new files.
+        # The fuse only arms once at least one file has been read — the
+        # documented workflow spends its first iterations on search_index and
+        # index.json reads, which the file tracker deliberately ignores, so
+        # counting those would force wrap-up before research could begin
+        current_file_count = len(files_investigated)
+        stagnant_iterations = state.get("stagnant_iterations", 0)
+        if current_file_count > 0 and current_file_count <= state.get("last_file_count", 0):
+            stagnant_iterations += 1
+        else:
+            stagnant_iterations = 0
+
+        if stagnant_iterations >= self.max_stagnant_iterations:
+            # Research has stalled; ask for the final answer with tools
+            # unbound so the response cannot spin through more no-op calls
+            wrap_up_msg = HumanMessage(content=(
+                f"[No new files investigated in the last {stagnant_iterations} iterations. "
+                f"Stop researching and give your comprehensive final answer now, "
+                f"based on the {current_file_count} files you have read.]"
+            ))
+            response = self.llm.invoke(self._trim_messages(list(messages) + [wrap_up_msg]))
+            return {
+                "messages": [response],
+                "iteration_count": iteration_count,
+                "files_investigated": files_investigated,
+                "last_file_count": current_file_count,
+                "stagnant_iterations": stagnant_iterations
+            }
+
+        # Add a transient one-line progress reminder every few iterations.
+        # It is only part of this call's message list and is never returned
+        # to the graph, so it doesn't accumulate in (or inflate) the history.
+        if iteration_count > 0 and iteration_count % 5 == 0:
+            progress_msg = HumanMessage(content=(
+                f"[Progress check, iteration {iteration_count}: "
+                f"{len(files_investigated)} files investigated. Simple questions need 5-10 files, "
+                f"complex ones 10-20; keep investigating or answer when you have enough.]"
+            ))
+            messages = list(messages) + [progress_msg]
+        
+        # Cap per-step prefill: keep the (cacheable) system prompt and question,
+        # but only the most recent tool exchanges from a long history
+        response = self.llm_with_tools.invoke(self._trim_messages(messages))
+
+        return {
+            "messages": [response],
+            "iteration_count": iteration_count,
+            "files_investigated": files_investigated,
+            "last_file_count": current_file_count,
+            "stagnant_iterations": stagnant_iterations
+        }
+
+    def _trim_messages(self, messages: Sequence[BaseMessage], keep_last: int = 12) -> list:
+        """
+        Trim message history before an LLM call.
+
+        Keeps the leading system/question messages verbatim (so the long
+        static prefix stays byte-identical across calls and hits provider
+        prompt caching) plus the last `keep_last` messages. Without this,
+        every iteration re-sends the entire growing history, making total
+        prefill cost quadratic in iteration count.
+        """
+        messages = list(messages)
+
+        # Leading system message(s) plus the user's question
+        head_len = 0
+        while head_len < len(messages) and isinstance(messages[head_len], SystemMessage):
+            head_len += 1
+        if head_len < len(messages) and isinstance(messages[head_len], HumanMessage):
+            head_len += 1
+
+        if len(messages) - head_len <= keep_last:
+            return messages
+
+        tail_start = len(messages) - keep_last
+        # Never start the window on a tool result whose calling message was trimmed
+        while tail_start > head_len and isinstance(messages[tail_start], ToolMessage):
+            tail_start -= 1
+
+        trimmed_count = tail_start - head_len
+        if trimmed_count <= 0:
+            return messages
+
+        note = HumanMessage(content=(
+            f"[{trimmed_count} earlier research messages trimmed to save context. "
+            f"Continue from your most recent findings.]"
+        ))
+        return messages[:head_len] + [note] + messages[tail_start:]
+
+    def _should_continue(self, state: AgentState) -> str:
+        """Determine if agent should continue or end."""
+        messages = state["messages"]
+        last_message = messages[-1]
+        
+        if hasattr(last_message, "tool_calls") and last_message.tool_calls:
+            return "continue"
+        return "end"
+    
+    def _create_system_prompt(self) -> str:
+        """Create system prompt with hierarchical distributed index information."""
+        
+        return _SYSTEM_PROMPT_TMPL.substitute(root=self.index_root_dir)
+
+    def _create_repo_info_prompt(self) -> str:
+        """
+        Create the dynamic repository-information prompt.
+
+        Kept separate from the large static system prompt so the static
+        prefix stays byte-identical across queries and agents, which lets
+        the provider's prompt cache skip re-prefilling it.
+        """
+        return f"""REPOSITORY INFORMATION:
 - Name: {self.repo_index.name}
 - Total Files: {self.repo_index.total_files}
 - Total Directories: {self.repo_index.total_directories}
@@ -433,17 +1152,33 @@ Begin your research now. Use the bash tool to navigate the distributed index and
 
     def query(self, question: str) -> dict:
         """
-        Process a query about the codebase.
-        
+        Process a query about the codebase (synchronous wrapper).
+
         Args:
             question: User's question about the code
-            
+
         Returns:
             Dictionary with answer and reasoning trace
         """
-        global _files_investigated
-        _files_investigated = []  # Reset for new query
-        
+        return asyncio.run(self.aquery(question))
+
+    async def aquery(self, question: str) -> dict:
+        """
+        Process a query about the codebase asynchronously.
+
+        Running the graph with ainvoke lets tool I/O overlap with LLM
+        round-trips (and parallel tool calls run concurrently) instead of
+        strictly serializing them.
+
+        Args:
+            question: User's question about the code
+
+        Returns:
+            Dictionary with answer and reasoning trace
+        """
+        _reset_investigated_files()  # Reset for new query
+
+
         print(f"\n{'='*80}")
         print(f"DISTRIBUTED CODE AGENT - DEEP RESEARCH MODE")
         print(f"{'='*80}")
@@ -453,20 +1188,19 @@ Begin your research now. Use the bash tool to navigate the distributed index and
         print(f"Mode: Distributed (separate file per directory)")
         print(f"{'='*80}\n")
         
-        # Create system message
-        system_message = SystemMessage(content=self._create_system_prompt())
-        
-        # Create initial state
+        # Create initial state (system messages are prebuilt in __init__)
         initial_state = {
-            "messages": [system_message, HumanMessage(content=question)],
+            "messages": [self._system_prompt, self._repo_info_prompt, HumanMessage(content=question)],
             "files_investigated": [],
-            "iteration_count": 0
+            "iteration_count": 0,
+            "last_file_count": 0,
+            "stagnant_iterations": 0
         }
-        
-        # Run the graph with increased recursion limit
-        final_state = self.graph.invoke(
+
+        # Run the graph; the limit is env-overridable via AGENT_RECURSION_LIMIT
+        final_state = await self.graph.ainvoke(
             initial_state,
-            config={"recursion_limit": 100}  # Allow more iterations for deep research
+            config={"recursion_limit": self.recursion_limit}
         )
         
         # Extract reasoning trace
@@ -476,7 +1210,7 @@ Begin your research now. Use the bash tool to navigate the distributed index and
         final_answer = final_state["messages"][-1].content
         
         # Get files investigated
-        files_investigated = _files_investigated
+        files_investigated = _get_investigated_files()
         
         # Print reasoning if verbose
         if self.verbose:
@@ -595,9 +1329,7 @@ def create_distributed_agent(
     if not os.path.exists(repo_index_path):
         raise FileNotFoundError(f"Repository index not found: {repo_index_path}")
     
-    with open(repo_index_path, 'r') as f:
-        repo_data = json.load(f)
-        repo_index = RepositoryIndex(**repo_data)
+    repo_index = RepositoryIndex.load(repo_index_path)
     
     return DistributedCodeAgent(
         repo_index=repo_index,
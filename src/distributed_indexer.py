@@ -6,15 +6,506 @@ Creates separate index files for each directory with references to subdirectorie
 import os
 import ast
 import json
+import time
+import random
+import asyncio
 import hashlib
-from typing import Optional, List
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from openai import OpenAI
+import sqlite3
+import threading
+from typing import Optional, List, Dict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from openai import (
+    OpenAI, AsyncOpenAI,
+    RateLimitError, APIStatusError, APIConnectionError, APITimeoutError
+)
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Optional fast path: tree-sitter's C parser releases the GIL and is several
+# times faster than ast.parse for one-shot parsing. Guarded broadly since an
+# ABI mismatch between the binding and grammar raises more than ImportError
+try:
+    import tree_sitter
+    import tree_sitter_python
+    _TS_PARSER = tree_sitter.Parser(tree_sitter.Language(tree_sitter_python.language()))
+except Exception:
+    _TS_PARSER = None
+
 from src.distributed_models import (
     CodeLanguage, CodeElementType, CodeElementMetadata,
     FileMetadata, SubdirectoryReference, DirectoryIndex, RepositoryIndex
 )
 
+_token_encoder = None
+
+# Slot of each element type in count_by_type vectors (declaration order,
+# matching the enums' wire ordinals)
+_ELEMENT_SLOTS = {t: i for i, t in enumerate(CodeElementType)}
+
+
+def _loads_json(data):
+    """Parse JSON text/bytes, preferring orjson when available."""
+    if orjson is not None:
+        return orjson.loads(data)
+    if isinstance(data, bytes):
+        data = data.decode('utf-8')
+    return json.loads(data)
+
+
+def _dumps_json(obj, indent: bool = False) -> str:
+    """Serialize to JSON text, preferring orjson when available."""
+    if orjson is not None:
+        option = orjson.OPT_INDENT_2 if indent else 0
+        return orjson.dumps(obj, default=str, option=option).decode('utf-8')
+    return json.dumps(obj, indent=2 if indent else None, default=str)
+
+
+def load_consolidated_indices(output_dir: str) -> Dict[str, DirectoryIndex]:
+    """
+    Load every directory index from the consolidated indices.jsonl file.
+
+    One sequential scan of a single file replaces thousands of small-file
+    opens for consumers that want the whole index at once; the per-directory
+    index.json files remain the source the agent navigates.
+    """
+    jsonl_path = os.path.join(output_dir, "indices.jsonl")
+    indices = {}
+    with open(jsonl_path, 'r') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = _loads_json(line)
+            indices[record["path"]] = DirectoryIndex.model_validate(record["index"])
+    return indices
+
+
+# Files at least this large go through tree-sitter when it is installed;
+# below it, ast.parse is cheap enough that the fidelity gap isn't worth it
+_TS_MIN_BYTES = 32 * 1024
+
+# Mirrors the branch node types _IndexVisitor counts: each elif_clause maps
+# to the nested ast.If, and each (binary) boolean_operator to one BoolOp term
+_TS_BRANCH_TYPES = frozenset({
+    'if_statement', 'elif_clause', 'while_statement', 'for_statement',
+    'except_clause', 'boolean_operator',
+})
+
+
+def _ts_complexity(node) -> int:
+    """Cyclomatic complexity of a tree-sitter function subtree."""
+    complexity = 1
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if current.type in _TS_BRANCH_TYPES:
+            complexity += 1
+        stack.extend(current.children)
+    return complexity
+
+
+def _ts_function_element(node, file_path: str, is_method: bool) -> CodeElementMetadata:
+    """Build a function/method element from a tree-sitter function_definition."""
+    name = node.child_by_field_name('name').text.decode()
+
+    params = []
+    params_node = node.child_by_field_name('parameters')
+    if params_node is not None:
+        for child in params_node.named_children:
+            if child.type == 'identifier':
+                params.append(child.text.decode())
+            else:
+                # typed/default parameters wrap their identifier
+                ident = next((c for c in child.children if c.type == 'identifier'), None)
+                if ident is not None:
+                    params.append(ident.text.decode())
+
+    return CodeElementMetadata.fast(
+        name=name,
+        element_type=CodeElementType.METHOD if is_method else CodeElementType.FUNCTION,
+        file_path=file_path,
+        start_line=node.start_point[0] + 1,
+        end_line=node.end_point[0] + 1,
+        signature=f"{name}({', '.join(params)})",
+        complexity=_ts_complexity(node),
+        is_public=not name.startswith('_')
+    )
+
+
+def _extract_via_treesitter(content_bytes: bytes, file_path: str):
+    """
+    Extract (imports, elements) with tree-sitter, mirroring _IndexVisitor.
+
+    Returns None when the parse has errors, so the caller falls back to
+    ast.parse and its (authoritative) SyntaxError handling.
+    """
+    try:
+        tree = _TS_PARSER.parse(content_bytes)
+    except Exception:
+        return None
+    root = tree.root_node
+    if root.has_error:
+        return None
+
+    imports: List[str] = []
+    elements: List[CodeElementMetadata] = []
+
+    def unwrap(node):
+        # Decorated defs wrap the real definition; ast has no such wrapper
+        if node.type == 'decorated_definition':
+            definition = node.child_by_field_name('definition')
+            if definition is not None:
+                return definition
+        return node
+
+    def collect_imports(block, if_depth: int = 0):
+        for stmt in block.named_children:
+            if stmt.type == 'import_statement':
+                for child in stmt.named_children:
+                    if child.type == 'dotted_name':
+                        imports.append(child.text.decode())
+                    elif child.type == 'aliased_import':
+                        name = child.child_by_field_name('name')
+                        if name is not None:
+                            imports.append(name.text.decode())
+            elif stmt.type == 'import_from_statement':
+                module_name = stmt.child_by_field_name('module_name')
+                if module_name is not None:
+                    if module_name.type == 'dotted_name':
+                        imports.append(module_name.text.decode())
+                    else:
+                        # relative_import: take the dotted part, like ast does
+                        dotted = next(
+                            (c for c in module_name.children if c.type == 'dotted_name'), None
+                        )
+                        if dotted is not None:
+                            imports.append(dotted.text.decode())
+            elif stmt.type == 'if_statement' and if_depth == 0:
+                consequence = stmt.child_by_field_name('consequence')
+                if consequence is not None:
+                    collect_imports(consequence, 1)
+            elif stmt.type == 'try_statement':
+                body = stmt.child_by_field_name('body')
+                if body is not None:
+                    collect_imports(body, if_depth)
+
+    for stmt in root.named_children:
+        stmt = unwrap(stmt)
+        if stmt.type == 'class_definition':
+            name_node = stmt.child_by_field_name('name')
+            if name_node is None:
+                continue
+            name = name_node.text.decode()
+            element = CodeElementMetadata.fast(
+                name=name,
+                element_type=CodeElementType.CLASS,
+                file_path=file_path,
+                start_line=stmt.start_point[0] + 1,
+                end_line=stmt.end_point[0] + 1,
+                is_public=not name.startswith('_')
+            )
+            body = stmt.child_by_field_name('body')
+            if body is not None:
+                for item in body.named_children:
+                    item = unwrap(item)
+                    if item.type == 'function_definition':
+                        element.children.append(_ts_function_element(item, file_path, True))
+            elements.append(element)
+        elif stmt.type == 'function_definition':
+            elements.append(_ts_function_element(stmt, file_path, False))
+
+    collect_imports(root)
+    return imports, elements
+
+
+# Directory names never worth indexing; a frozenset makes the per-entry
+# membership test a single hash lookup built once at import time
+_IGNORED_DIR_NAMES = frozenset({
+    'node_modules', '__pycache__', 'venv', '.venv', 'dist', 'build',
+    '.git', '.mypy_cache', '.pytest_cache',
+})
+
+
+def _should_skip_entry(name: str) -> bool:
+    """Whether a directory entry is hidden or on the ignore list."""
+    return name.startswith('.') or name in _IGNORED_DIR_NAMES
+
+
+# Directories with at least this many files get their parsing farmed out to
+# worker processes; below it, fork overhead outweighs the parallel parse
+_PROCESS_POOL_MIN_FILES = 4
+
+
+def _parse_python_file_worker(file_path: str, repo_root: str) -> Optional[dict]:
+    """
+    Read, hash, and parse one Python file, returning a picklable payload.
+
+    Runs in a worker process, so it lives at module level and touches no
+    indexer state (API clients, caches) that cannot cross process boundaries.
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            raw = f.read()
+        content = raw.decode('utf-8')
+    except Exception as e:
+        print(f"  ⚠️  Error reading {file_path}: {e}")
+        return None
+
+    payload = {
+        'file_path': file_path,
+        'relative_path': os.path.relpath(file_path, repo_root),
+        'file_hash': hashlib.blake2b(raw, digest_size=16).digest(),
+        'total_lines': len(content.splitlines()),
+        'imports': [],
+        'elements': [],
+    }
+
+    try:
+        tree = ast.parse(content)
+    except SyntaxError:
+        return payload
+
+    visitor = _IndexVisitor(file_path)
+    visitor.visit(tree)
+    payload['imports'] = visitor.imports
+    payload['elements'] = [e.model_dump(mode='json') for e in visitor.elements]
+    return payload
+
+
+def _estimate_tokens(text: str) -> int:
+    """Count tokens with tiktoken when available, else estimate at ~4 chars/token."""
+    global _token_encoder
+    if _token_encoder is None and tiktoken is not None:
+        try:
+            _token_encoder = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _token_encoder = False  # encoder unavailable, fall back for good
+    if _token_encoder:
+        return len(_token_encoder.encode(text))
+    return len(text) // 4 + 1
+
+
+class _IndexVisitor(ast.NodeVisitor):
+    """
+    Single-pass AST visitor collecting imports, top-level elements, and
+    per-function complexity in one traversal.
+
+    Replaces three separate walks: ast.walk for imports, a tree.body scan
+    for definitions, and another ast.walk per function for complexity.
+    """
+
+    # Node type -> handler, filled lazily and shared across instances so the
+    # hot visit() path skips NodeVisitor's per-node string concat + getattr
+    _dispatch_cache: dict = {}
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.imports: List[str] = []
+        self.elements: List[CodeElementMetadata] = []
+        self._class_depth = 0
+        self._func_depth = 0
+        self._capture_class: Optional[CodeElementMetadata] = None
+        self._complexity_stack: List[int] = []
+        self._if_depth = 0
+
+    def visit(self, node):
+        """Dispatch on type(node) through a cached handler table."""
+        node_cls = type(node)
+        method = self._dispatch_cache.get(node_cls)
+        if method is None:
+            method = getattr(_IndexVisitor, 'visit_' + node_cls.__name__,
+                             _IndexVisitor.generic_visit)
+            self._dispatch_cache[node_cls] = method
+        return method(self, node)
+
+    # -- imports ------------------------------------------------------
+    # Only module-level imports (allowing one enclosing `if`, for
+    # TYPE_CHECKING and version guards) describe a file's dependencies;
+    # imports buried in functions or classes are noise for the index
+
+    def _records_imports(self) -> bool:
+        return self._class_depth == 0 and self._func_depth == 0 and self._if_depth <= 1
+
+    def visit_Import(self, node: ast.Import):
+        if self._records_imports():
+            for alias in node.names:
+                self.imports.append(alias.name)
+
+    def visit_ImportFrom(self, node: ast.ImportFrom):
+        if self._records_imports() and node.module:
+            self.imports.append(node.module)
+
+    # -- definitions --------------------------------------------------
+
+    def visit_ClassDef(self, node: ast.ClassDef):
+        is_top_level = self._class_depth == 0 and self._func_depth == 0
+        if is_top_level:
+            element = CodeElementMetadata.fast(
+                name=node.name,
+                element_type=CodeElementType.CLASS,
+                file_path=self.file_path,
+                start_line=node.lineno,
+                end_line=node.end_lineno or node.lineno,
+                is_public=not node.name.startswith('_')
+            )
+            self.elements.append(element)
+            self._capture_class = element
+
+        self._class_depth += 1
+        self.generic_visit(node)
+        self._class_depth -= 1
+
+        if is_top_level:
+            self._capture_class = None
+
+    def visit_FunctionDef(self, node):
+        self._visit_function(node)
+
+    def visit_AsyncFunctionDef(self, node):
+        self._visit_function(node)
+
+    def _visit_function(self, node):
+        # Capture module-level functions and direct methods of top-level
+        # classes; anything nested deeper only contributes to complexity
+        captured = None
+        if self._class_depth == 0 and self._func_depth == 0:
+            captured = self._make_function_element(node, is_method=False)
+            self.elements.append(captured)
+        elif self._class_depth == 1 and self._func_depth == 0 and self._capture_class is not None:
+            captured = self._make_function_element(node, is_method=True)
+            self._capture_class.children.append(captured)
+
+        if captured:
+            self._complexity_stack.append(1)
+        self._func_depth += 1
+        self.generic_visit(node)
+        self._func_depth -= 1
+        if captured:
+            captured.complexity = self._complexity_stack.pop()
+
+    def _make_function_element(self, node, is_method: bool) -> CodeElementMetadata:
+        args = [arg.arg for arg in node.args.args]
+        return CodeElementMetadata.fast(
+            name=node.name,
+            element_type=CodeElementType.METHOD if is_method else CodeElementType.FUNCTION,
+            file_path=self.file_path,
+            start_line=node.lineno,
+            end_line=node.end_lineno or node.lineno,
+            signature=f"{node.name}({', '.join(args)})",
+            is_public=not node.name.startswith('_')
+        )
+
+    # -- complexity ---------------------------------------------------
+
+    def _bump_complexity(self, amount: int = 1):
+        if self._complexity_stack:
+            self._complexity_stack[-1] += amount
+
+    def visit_If(self, node):
+        self._bump_complexity()
+        self._if_depth += 1
+        self.generic_visit(node)
+        self._if_depth -= 1
+
+    def visit_While(self, node):
+        self._bump_complexity()
+        self.generic_visit(node)
+
+    def visit_For(self, node):
+        self._bump_complexity()
+        self.generic_visit(node)
+
+    def visit_ExceptHandler(self, node):
+        self._bump_complexity()
+        self.generic_visit(node)
+
+    def visit_BoolOp(self, node):
+        self._bump_complexity(len(node.values) - 1)
+        self.generic_visit(node)
+
+
+class SummaryCache:
+    """
+    Persistent cache for LLM summaries, keyed by content hash.
+
+    Backed by SQLite in WAL mode so re-indexing a mostly unchanged repo only
+    pays for changed files. Keys incorporate the model name and a prompt
+    version, so changing either invalidates old entries automatically.
+    """
+
+    PROMPT_VERSION = "v1"
+    PARSE_VERSION = "v2"
+
+    def __init__(self, path: str, model: str):
+        self.model = model
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()  # Serialize access across indexing threads
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS summaries (key TEXT PRIMARY KEY, summary TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS parsed_files (key TEXT PRIMARY KEY, payload TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    def _key(self, content_hash) -> str:
+        # content hashes arrive as raw digest bytes; directory keys as hex
+        if isinstance(content_hash, bytes):
+            content_hash = content_hash.hex()
+        raw = f"{self.model}|{self.PROMPT_VERSION}|{content_hash}"
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def _parse_key(self, content_hash) -> str:
+        if isinstance(content_hash, bytes):
+            content_hash = content_hash.hex()
+        # Parse results depend only on file content, not on the LLM model
+        raw = f"parse|{self.PARSE_VERSION}|{content_hash}"
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, content_hash) -> Optional[str]:
+        """Return the cached summary for a content hash, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary FROM summaries WHERE key = ?", (self._key(content_hash),)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, content_hash, summary: str) -> None:
+        """Persist a summary for a content hash."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries (key, summary) VALUES (?, ?)",
+                (self._key(content_hash), summary)
+            )
+            self._conn.commit()
+
+    def get_parsed(self, content_hash) -> Optional[str]:
+        """Return the cached parse payload (JSON) for a content hash, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM parsed_files WHERE key = ?",
+                (self._parse_key(content_hash),)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_parsed(self, content_hash, payload: str) -> None:
+        """Persist a parse payload (JSON) for a content hash."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO parsed_files (key, payload) VALUES (?, ?)",
+                (self._parse_key(content_hash), payload)
+            )
+            self._conn.commit()
+
 
 class DistributedCodeIndexer:
     """
@@ -29,14 +520,104 @@ class DistributedCodeIndexer:
       - etc.
     """
     
-    def __init__(self, api_key: str, base_url: Optional[str] = None, model: str = "gpt-4o-mini", max_workers: int = 10):
+    def __init__(
+        self,
+        api_key: str,
+        base_url: Optional[str] = None,
+        model: str = "gpt-4o-mini",
+        max_workers: int = 10,
+        rows_per_call: int = 8,
+        tokens_per_call: int = 6000,
+        cache_path: Optional[str] = None
+    ):
         """Initialize indexer with OpenAI client."""
         self.client = OpenAI(api_key=api_key, base_url=base_url)
+        self.aclient = AsyncOpenAI(api_key=api_key, base_url=base_url)
         self.model = model
         self.indexed_dirs = {}  # Cache for indexed directories
+        self.content_index = {}  # content hash -> first FileMetadata seen with it
+        self._content_index_lock = threading.Lock()
         self.max_workers = max_workers  # Parallel workers for LLM calls
-        self.summary_cache = {}  # Cache for file summaries (hash -> summary)
+        self.rows_per_call = rows_per_call  # Max files marshaled into one LLM call
+        self.tokens_per_call = tokens_per_call  # Input-token budget per summary call
+
+        # Persistent summary cache (survives runs; hash -> summary)
+        if cache_path is None:
+            cache_path = os.path.join(
+                os.path.expanduser("~"), ".cache", "code_pageindex", "summaries.db"
+            )
+        self.summary_cache = SummaryCache(cache_path, model)
+
+        # Adaptive concurrency (AIMD): halve on rate limits, creep back up
+        # toward max_workers after sustained success
+        self._concurrency = max_workers
+        self._success_streak = 0
+        self._max_retries = 5
+
+        # Shared process pool for CPU-bound parsing, created on first use
+        self._process_pool = None
+        self._process_pool_lock = threading.Lock()
     
+    # ------------------------------------------------------------------
+    # LLM call adapters: retry with exponential backoff on rate limits and
+    # transient server errors, and adapt concurrency to the quota ceiling
+    # ------------------------------------------------------------------
+
+    def _note_llm_success(self):
+        """Additively grow concurrency after a sustained run of successes."""
+        self._success_streak += 1
+        if self._success_streak >= 20 and self._concurrency < self.max_workers:
+            self._concurrency += 1
+            self._success_streak = 0
+
+    def _note_llm_backoff(self):
+        """Halve concurrency after a rate-limit or server error."""
+        self._success_streak = 0
+        self._concurrency = max(1, self._concurrency // 2)
+
+    @staticmethod
+    def _retry_delay(error, attempt: int) -> float:
+        """Backoff delay for a failed call, honoring Retry-After when sent."""
+        try:
+            retry_after = error.response.headers.get("retry-after")
+            if retry_after:
+                return min(float(retry_after), 30.0)
+        except (AttributeError, ValueError):
+            pass
+        return min(2 ** attempt + random.random(), 30.0)
+
+    @staticmethod
+    def _is_retryable(error) -> bool:
+        if isinstance(error, (RateLimitError, APIConnectionError, APITimeoutError)):
+            return True
+        return isinstance(error, APIStatusError) and error.status_code >= 500
+
+    def _llm_call_with_retry(self, **kwargs):
+        """chat.completions.create with retries (sync client)."""
+        for attempt in range(self._max_retries):
+            try:
+                response = self.client.chat.completions.create(**kwargs)
+                self._note_llm_success()
+                return response
+            except Exception as e:
+                if not self._is_retryable(e) or attempt == self._max_retries - 1:
+                    raise
+                self._note_llm_backoff()
+                time.sleep(self._retry_delay(e, attempt))
+
+    async def _allm_call_with_retry(self, **kwargs):
+        """chat.completions.create with retries (async client)."""
+        for attempt in range(self._max_retries):
+            try:
+                response = await self.aclient.chat.completions.create(**kwargs)
+                self._note_llm_success()
+                return response
+            except Exception as e:
+                if not self._is_retryable(e) or attempt == self._max_retries - 1:
+                    raise
+                self._note_llm_backoff()
+                await asyncio.sleep(self._retry_delay(e, attempt))
+
     def index_repository(
         self,
         repo_path: str,
@@ -64,7 +645,26 @@ class DistributedCodeIndexer:
         
         # Create output directory (hierarchical structure)
         os.makedirs(output_dir, exist_ok=True)
-        
+
+        # Statistics accumulator, filled in as directories are indexed so we
+        # never have to re-read the index files afterwards just to count
+        self._stats = {
+            'directories': 0,
+            'files': 0,
+            'lines': 0,
+            'classes': 0,
+            'functions': 0,
+            'methods': 0,
+            'external_dependencies': set(),
+            'file_relative_paths': [],
+        }
+        self._stats_lock = threading.Lock()
+
+        # Serialized directory indices collected as they are saved, flushed
+        # to the consolidated indices.jsonl at the end of the run
+        self._saved_indices = []
+        self._saved_indices_lock = threading.Lock()
+
         # Index root directory (recursive, bottom-up)
         # This will create a hierarchical folder structure mirroring the repo
         root_index = self._index_directory(
@@ -75,6 +675,12 @@ class DistributedCodeIndexer:
             generate_summaries=generate_summaries
         )
         
+        # The recursion leaves the root directory itself unsummarized and
+        # unsaved (every other directory was handled by its parent)
+        if generate_summaries:
+            self._batch_generate_directory_summaries([root_index])
+        self._save_directory_index(root_index, output_dir)
+
         # Create repository index
         repo_name = os.path.basename(repo_path)
         repo_index = RepositoryIndex(
@@ -86,29 +692,43 @@ class DistributedCodeIndexer:
             primary_language="python"
         )
         
-        # Calculate statistics (bottom-up from root)
-        self._calculate_statistics(repo_index, root_index, output_dir)
+        # Copy statistics accumulated during the recursion
+        self._calculate_statistics(repo_index)
+
+        # Negative path lookups answer straight from the repo index
+        repo_index.build_path_bloom(self._stats['file_relative_paths'])
         
         # Generate repository summary
         if generate_summaries:
             repo_index.summary = self._generate_repo_summary(repo_index, root_index)
             repo_index.architecture_description = f"Distributed index with {repo_index.total_directories} directories"
         
+        # Consolidated single-file store alongside the per-directory files:
+        # one JSON line per directory, in path order, for bulk consumers
+        jsonl_path = os.path.join(output_dir, "indices.jsonl")
+        with open(jsonl_path, 'w') as f:
+            for saved_relative_path, dumped in sorted(self._saved_indices):
+                f.write(f'{{"path": {json.dumps(saved_relative_path)}, "index": {dumped}}}\n')
+
         # Save repository index
         repo_index_path = os.path.join(output_dir, "repo_index.json")
         with open(repo_index_path, 'w') as f:
-            json.dump(repo_index.model_dump(), f, indent=2, default=str)
+            f.write(repo_index.model_dump_json(indent=2))
         
         print(f"\n{'='*80}")
         print(f"INDEXING COMPLETE")
         print(f"{'='*80}")
         print(f"Repository index: {repo_index_path}")
-        print(f"Directory indices: {index_dir}/")
+        print(f"Directory indices: {output_dir}/")
         print(f"Total files: {repo_index.total_files}")
         print(f"Total directories: {repo_index.total_directories}")
         print(f"Total lines: {repo_index.total_lines:,}")
         print(f"{'='*80}\n")
-        
+
+        if self._process_pool is not None:
+            self._process_pool.shutdown()
+            self._process_pool = None
+
         return repo_index
     
     def _index_directory(
@@ -150,55 +770,100 @@ class DistributedCodeIndexer:
         )
         
         try:
-            items = sorted(os.listdir(dir_path))
+            # Single scandir pass: DirEntry caches is_file/is_dir results from
+            # the directory read itself, avoiding two stat syscalls per entry
+            with os.scandir(dir_path) as it:
+                entries = sorted(it, key=lambda e: e.name)
         except PermissionError:
             return dir_index
-        
-        # First, index all files in this directory
-        for item in items:
-            item_path = os.path.join(dir_path, item)
-            
+
+        py_files = []
+        subdir_items = []
+        for entry in entries:
             # Skip hidden files and common ignore patterns
-            if item.startswith('.') or item in ['node_modules', '__pycache__', 'venv', '.venv', 'dist', 'build']:
+            if _should_skip_entry(entry.name):
                 continue
-            
-            if os.path.isfile(item_path) and item.endswith('.py'):
-                file_metadata = self._index_python_file(item_path, repo_root, generate_summaries)
-                if file_metadata:
-                    dir_index.files.append(file_metadata)
-                    dir_index.direct_file_count += 1
-                    print(f"  ✓ Indexed: {os.path.relpath(item_path, repo_root)} ({len(file_metadata.elements)} elements)")
-        
-        # Second, recursively index subdirectories (BOTTOM-UP)
-        for item in items:
-            item_path = os.path.join(dir_path, item)
-            
-            if item.startswith('.') or item in ['node_modules', '__pycache__', 'venv', '.venv', 'dist', 'build']:
-                continue
-            
-            if os.path.isdir(item_path):
-                # BOTTOM-UP: Recursively index subdirectory first (leaf to root)
-                # This ensures child summaries are available when generating parent summary
-                subdir_index = self._index_directory(
-                    dir_path=item_path,
-                    repo_root=repo_root,
-                    output_root=output_root,
-                    parent_index_path=index_file_path,
-                    generate_summaries=generate_summaries
-                )
-                
-                # Create reference to subdirectory
-                subdir_ref = SubdirectoryReference(
-                    dir_name=item,
-                    dir_path=item_path,
-                    relative_path=subdir_index.relative_path,
-                    index_file_path=subdir_index.index_file_path,
-                    summary=subdir_index.summary,
-                    file_count=subdir_index.total_file_count,
-                    subdir_count=len(subdir_index.subdirectories)
+
+            if entry.is_file(follow_symlinks=False) and entry.name.endswith('.py'):
+                py_files.append(entry.path)
+            elif entry.is_dir(follow_symlinks=False):
+                subdir_items.append((entry.name, entry.path))
+
+        # First, index all files in this directory. AST parsing is CPU-bound,
+        # so a file-heavy directory fans its parses out to worker processes
+        # (threads would serialize on the GIL); small directories parse
+        # inline, where they also get the parse cache's re-index fast path.
+        # With tree-sitter installed the parser releases the GIL, so the
+        # sibling-directory threads already parse in parallel and the
+        # process pool's fork overhead isn't worth paying
+        if _TS_PARSER is None and len(py_files) >= _PROCESS_POOL_MIN_FILES:
+            futures = [
+                self._get_process_pool().submit(_parse_python_file_worker, item_path, repo_root)
+                for item_path in py_files
+            ]
+            file_results = []
+            for future in futures:
+                payload = future.result()
+                file_results.append(
+                    self._file_metadata_from_payload(payload, generate_summaries)
+                    if payload is not None else None
                 )
-                
-                dir_index.subdirectories.append(subdir_ref)
+        else:
+            file_results = [
+                self._index_python_file(item_path, repo_root, generate_summaries)
+                for item_path in py_files
+            ]
+
+        for item_path, file_metadata in zip(py_files, file_results):
+            if file_metadata:
+                dir_index.files.append(file_metadata)
+                dir_index.direct_file_count += 1
+                print(f"  ✓ Indexed: {os.path.relpath(item_path, repo_root)} ({len(file_metadata.elements)} elements)")
+
+        # Second, recursively index subdirectories (BOTTOM-UP)
+
+        # BOTTOM-UP: Recursively index subdirectories first (leaf to root).
+        # This ensures child summaries are available when generating parent
+        # summary. Sibling subtrees are independent until aggregation, so
+        # index them in parallel when there is more than one.
+        def index_subdir(item_path: str) -> DirectoryIndex:
+            return self._index_directory(
+                dir_path=item_path,
+                repo_root=repo_root,
+                output_root=output_root,
+                parent_index_path=index_file_path,
+                generate_summaries=generate_summaries
+            )
+
+        if len(subdir_items) > 1:
+            with ThreadPoolExecutor(max_workers=min(len(subdir_items), self.max_workers)) as executor:
+                subdir_indices = list(executor.map(index_subdir, [p for _, p in subdir_items]))
+        else:
+            subdir_indices = [index_subdir(p) for _, p in subdir_items]
+
+        # BATCH: one marshaled LLM call summarizes all child directories at
+        # once (their own files and subtrees were summarized on the way up).
+        # Children are saved only after their summaries are filled in; this
+        # directory's own summary is set the same way by OUR parent (or by
+        # index_repository for the root), which also writes our index file.
+        if generate_summaries and subdir_indices:
+            self._batch_generate_directory_summaries(subdir_indices)
+        for subdir_index in subdir_indices:
+            self._save_directory_index(subdir_index, output_root)
+
+        for (item, item_path), subdir_index in zip(subdir_items, subdir_indices):
+            # Create reference to subdirectory
+            subdir_ref = SubdirectoryReference(
+                dir_name=item,
+                dir_path=item_path,
+                relative_path=subdir_index.relative_path,
+                index_file_path=subdir_index.index_file_path,
+                summary=subdir_index.summary,
+                file_count=subdir_index.total_file_count,
+                subdir_count=len(subdir_index.subdirectories)
+            )
+
+            dir_index.subdirectories.append(subdir_ref)
         
         # Calculate statistics for this directory (bottom-up aggregation)
         dir_index.total_file_count = dir_index.direct_file_count
@@ -208,25 +873,35 @@ class DistributedCodeIndexer:
         for subdir_ref in dir_index.subdirectories:
             dir_index.total_file_count += subdir_ref.file_count
         
+        # Fold this directory's counts into the repository-wide accumulator
+        # while the parsed files are still in memory (subdirectories have
+        # already added their own counts on the way back up)
+        self._accumulate_statistics(dir_index)
+
         # BATCH GENERATE: Generate file summaries in parallel for this directory
         if generate_summaries and dir_index.files:
             self._batch_generate_file_summaries(dir_index.files)
         
-        # BOTTOM-UP: Generate directory summary AFTER all children are indexed
-        # This ensures we have complete information from all subdirectories
-        if generate_summaries and (dir_index.files or dir_index.subdirectories):
-            print(f"  🤖 Generating summary for {relative_path}...")
-            dir_index.summary = self._generate_directory_summary(dir_index)
-        
-        # Save this directory's index to hierarchical location
-        with open(index_file_path, 'w') as f:
-            json.dump(dir_index.model_dump(), f, indent=2, default=str)
-        
-        print(f"  ✅ Saved: {os.path.relpath(index_file_path, output_root)}")
+        # NOTE: this directory's summary and index file are written by the
+        # caller (see the batching block above), after all siblings can be
+        # summarized together
+        return dir_index
+
+    def _save_directory_index(self, dir_index: DirectoryIndex, output_root: str):
+        """Write a directory's index file to its hierarchical location."""
+        # Serializing straight from the model keeps the whole dump in
+        # pydantic-core's Rust serializer instead of detouring through a
+        # Python dict, and the compact form shrinks files read via cat/jq.
+        # dump() writes through an mmap'd destination and hands back the
+        # serialized bytes, which also feed the consolidated JSONL store
+        dumped = dir_index.dump(dir_index.index_file_path).decode()
+
+        with self._saved_indices_lock:
+            self._saved_indices.append((dir_index.relative_path, dumped))
+
+        print(f"  ✅ Saved: {os.path.relpath(dir_index.index_file_path, output_root)}")
         print(f"     Files: {dir_index.direct_file_count} direct, {dir_index.total_file_count} total")
         print(f"     Subdirs: {len(dir_index.subdirectories)}")
-        
-        return dir_index
     
     def _index_python_file(
         self,
@@ -236,231 +911,305 @@ class DistributedCodeIndexer:
     ) -> Optional[FileMetadata]:
         """Index a Python file (metadata only, no code content)."""
         
+        # Read once as bytes: the same buffer feeds both the content hash
+        # and (decoded) the AST parse, so each file is read exactly once
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
+            with open(file_path, 'rb') as f:
+                raw = f.read()
+            content = raw.decode('utf-8')
         except Exception as e:
             print(f"  ⚠️  Error reading {file_path}: {e}")
             return None
-        
+
         relative_path = os.path.relpath(file_path, repo_root)
-        
+        file_hash = hashlib.blake2b(raw, digest_size=16).digest()
+
         file_metadata = FileMetadata(
             file_path=file_path,
             relative_path=relative_path,
             language=CodeLanguage.PYTHON,
             total_lines=len(content.splitlines())
         )
-        
-        # Parse with AST
-        try:
-            tree = ast.parse(content)
-        except SyntaxError:
+
+        # A byte-identical file elsewhere in the repo (vendored copies,
+        # duplicated fixtures) reuses that file's parse and summary outright
+        duplicate = self._find_duplicate(file_hash)
+        if duplicate is not None:
+            self._copy_duplicate_metadata(duplicate, file_metadata, file_hash, generate_summaries)
             return file_metadata
-        
-        # Extract imports
-        for node in ast.walk(tree):
-            if isinstance(node, ast.Import):
-                for alias in node.names:
-                    file_metadata.imports.append(alias.name)
-            elif isinstance(node, ast.ImportFrom):
-                if node.module:
-                    file_metadata.imports.append(node.module)
-        
-        # Extract top-level elements (metadata only)
-        for node in tree.body:
-            if isinstance(node, ast.ClassDef):
-                element = self._extract_class_metadata(node, file_path)
-                file_metadata.elements.append(element)
-            elif isinstance(node, ast.FunctionDef) or isinstance(node, ast.AsyncFunctionDef):
-                element = self._extract_function_metadata(node, file_path)
-                file_metadata.elements.append(element)
-        
+
+        # On a parse-cache hit the AST parse and traversal are skipped
+        # entirely; only the paths need refreshing in case the file moved
+        cached_payload = self.summary_cache.get_parsed(file_hash)
+        if cached_payload is not None:
+            payload = _loads_json(cached_payload)
+            file_metadata.imports = payload['imports']
+            file_metadata.elements = [
+                CodeElementMetadata.model_validate(e) for e in payload['elements']
+            ]
+            self._repoint_elements(file_metadata.elements, file_path)
+        else:
+            # Large files take the tree-sitter fast path when it's installed;
+            # errors (or its absence) fall through to ast.parse
+            extracted = None
+            if _TS_PARSER is not None and len(raw) >= _TS_MIN_BYTES:
+                extracted = _extract_via_treesitter(raw, file_path)
+
+            if extracted is not None:
+                file_metadata.imports, file_metadata.elements = extracted
+            else:
+                # Parse with AST
+                try:
+                    tree = ast.parse(content)
+                except SyntaxError:
+                    return file_metadata
+
+                # Extract imports, elements, and complexity in one traversal
+                visitor = _IndexVisitor(file_path)
+                visitor.visit(tree)
+                file_metadata.imports = visitor.imports
+                file_metadata.elements = visitor.elements
+
+            self.summary_cache.set_parsed(file_hash, _dumps_json({
+                'imports': file_metadata.imports,
+                'elements': [e.model_dump(mode='json') for e in file_metadata.elements],
+            }))
+
         # BOTTOM-UP: Generate file summary if requested (with caching)
         if generate_summaries:
-            # Use file hash for caching
-            file_hash = self._hash_file(file_path)
-            if file_hash in self.summary_cache:
-                file_metadata.summary = self.summary_cache[file_hash]
+            cached_summary = self.summary_cache.get(file_hash)
+            if cached_summary is not None:
+                file_metadata.summary = cached_summary
             else:
                 # Will be generated in batch later
                 file_metadata.summary = None
                 file_metadata.file_hash = file_hash  # Store hash for batch processing
-        
+
+        self._register_content(file_hash, file_metadata)
         return file_metadata
     
-    def _extract_class_metadata(self, node: ast.ClassDef, file_path: str) -> CodeElementMetadata:
-        """Extract class metadata (no code content)."""
-        
-        element = CodeElementMetadata(
-            name=node.name,
-            element_type=CodeElementType.CLASS,
-            file_path=file_path,
-            start_line=node.lineno,
-            end_line=node.end_lineno or node.lineno,
-            is_public=not node.name.startswith('_')
-        )
-        
-        # Extract methods
-        for item in node.body:
-            if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)):
-                method = self._extract_function_metadata(item, file_path, is_method=True)
-                element.children.append(method)
-        
-        return element
-    
-    def _extract_function_metadata(
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        """Create the shared parser process pool on first use."""
+        with self._process_pool_lock:
+            if self._process_pool is None:
+                self._process_pool = ProcessPoolExecutor(max_workers=os.cpu_count())
+            return self._process_pool
+
+    def _file_metadata_from_payload(
         self,
-        node: ast.FunctionDef,
-        file_path: str,
-        is_method: bool = False
-    ) -> CodeElementMetadata:
-        """Extract function/method metadata (no code content)."""
-        
-        # Build signature
-        args = [arg.arg for arg in node.args.args]
-        signature = f"{node.name}({', '.join(args)})"
-        
-        element = CodeElementMetadata(
-            name=node.name,
-            element_type=CodeElementType.METHOD if is_method else CodeElementType.FUNCTION,
-            file_path=file_path,
-            start_line=node.lineno,
-            end_line=node.end_lineno or node.lineno,
-            signature=signature,
-            complexity=self._calculate_complexity(node),
-            is_public=not node.name.startswith('_')
+        payload: dict,
+        generate_summaries: bool
+    ) -> FileMetadata:
+        """Rebuild FileMetadata from a worker payload and apply the caches."""
+
+        duplicate = self._find_duplicate(payload['file_hash'])
+        if duplicate is not None:
+            file_metadata = FileMetadata(
+                file_path=payload['file_path'],
+                relative_path=payload['relative_path'],
+                language=CodeLanguage.PYTHON,
+                total_lines=payload['total_lines']
+            )
+            self._copy_duplicate_metadata(
+                duplicate, file_metadata, payload['file_hash'], generate_summaries
+            )
+            return file_metadata
+
+        file_metadata = FileMetadata(
+            file_path=payload['file_path'],
+            relative_path=payload['relative_path'],
+            language=CodeLanguage.PYTHON,
+            total_lines=payload['total_lines'],
+            imports=payload['imports'],
+            elements=[CodeElementMetadata.model_validate(e) for e in payload['elements']]
         )
-        
-        return element
-    
-    def _calculate_complexity(self, node: ast.FunctionDef) -> int:
-        """Calculate cyclomatic complexity."""
-        complexity = 1
-        for child in ast.walk(node):
-            if isinstance(child, (ast.If, ast.While, ast.For, ast.ExceptHandler)):
-                complexity += 1
-            elif isinstance(child, ast.BoolOp):
-                complexity += len(child.values) - 1
-        return complexity
-    
+
+        file_hash = payload['file_hash']
+        self.summary_cache.set_parsed(file_hash, _dumps_json({
+            'imports': payload['imports'],
+            'elements': payload['elements'],
+        }))
+
+        if generate_summaries:
+            cached_summary = self.summary_cache.get(file_hash)
+            if cached_summary is not None:
+                file_metadata.summary = cached_summary
+            else:
+                file_metadata.file_hash = file_hash  # Store hash for batch processing
+
+        self._register_content(file_hash, file_metadata)
+        return file_metadata
+
+    def _find_duplicate(self, file_hash: str) -> Optional[FileMetadata]:
+        """Return the first file indexed with this content hash, if any."""
+        with self._content_index_lock:
+            return self.content_index.get(file_hash)
+
+    def _register_content(self, file_hash: str, file_metadata: FileMetadata):
+        """Record a file as the canonical holder of its content hash."""
+        with self._content_index_lock:
+            self.content_index.setdefault(file_hash, file_metadata)
+
+    def _copy_duplicate_metadata(
+        self,
+        duplicate: FileMetadata,
+        file_metadata: FileMetadata,
+        file_hash: str,
+        generate_summaries: bool
+    ):
+        """Fill a FileMetadata from a byte-identical file already indexed."""
+        file_metadata.imports = list(duplicate.imports)
+        # Deep-copy so repointing file paths can't corrupt the original
+        file_metadata.elements = [e.model_copy(deep=True) for e in duplicate.elements]
+        self._repoint_elements(file_metadata.elements, file_metadata.file_path)
+        if generate_summaries:
+            file_metadata.summary = duplicate.summary
+            if file_metadata.summary is None:
+                # The original's summary is still pending its batch; queue
+                # this copy too and let the summary cache converge them
+                file_metadata.file_hash = file_hash
+
+    @staticmethod
+    def _repoint_elements(elements: List[CodeElementMetadata], file_path: str):
+        """Point cached elements (and their children) at the current file path."""
+        stack = list(elements)
+        while stack:
+            element = stack.pop()
+            element.file_path = file_path
+            stack.extend(element.children)
+
     def _get_index_filename(self, relative_path: str) -> str:
         """Generate index filename for a directory (always index.json)."""
         # In hierarchical structure, every directory has index.json
         return 'index.json'
     
-    def _calculate_statistics(self, repo_index: RepositoryIndex, root_index: DirectoryIndex, index_dir: str):
-        """Calculate repository statistics by traversing all directory indices."""
-        
-        def traverse(dir_index: DirectoryIndex):
-            repo_index.total_directories += 1
-            repo_index.total_files += dir_index.direct_file_count
-            repo_index.total_lines += sum(f.total_lines for f in dir_index.files)
-            
-            # Count elements
-            for file in dir_index.files:
-                for element in file.elements:
-                    if element.element_type == CodeElementType.CLASS:
-                        repo_index.total_classes += 1
-                        repo_index.total_methods += len(element.children)
-                    elif element.element_type == CodeElementType.FUNCTION:
-                        repo_index.total_functions += 1
-                
-                # Collect external dependencies
-                for imp in file.imports:
-                    if '.' not in imp and imp not in ['os', 'sys', 'json', 're']:
-                        if imp not in repo_index.external_dependencies:
-                            repo_index.external_dependencies.append(imp)
-            
-            # Recursively traverse subdirectories
-            for subdir_ref in dir_index.subdirectories:
-                # Load subdirectory index
-                with open(subdir_ref.index_file_path, 'r') as f:
-                    subdir_data = json.load(f)
-                    subdir_index = DirectoryIndex(**subdir_data)
-                    traverse(subdir_index)
-        
-        traverse(root_index)
-    
-    def _generate_file_summary(self, file_path: str, file_metadata: FileMetadata) -> str:
-        """Generate LLM summary for a file (bottom-up: file level)."""
-        
-        if not file_metadata.elements:
-            return f"Python file with {file_metadata.total_lines} lines"
-        
-        elements_desc = []
-        for element in file_metadata.elements[:10]:
-            if element.element_type == CodeElementType.CLASS:
-                elements_desc.append(f"- Class: {element.name} ({len(element.children)} methods)")
-            else:
-                elements_desc.append(f"- {element.element_type.value}: {element.name}")
-        
-        imports_str = ', '.join(file_metadata.imports[:5]) if file_metadata.imports else 'none'
-        
-        prompt = f"""Summarize this Python file in one concise sentence:
+    def _accumulate_statistics(self, dir_index: DirectoryIndex):
+        """Fold one directory's counts into the repository-wide accumulator."""
 
-File: {file_metadata.relative_path}
-Lines: {file_metadata.total_lines}
-Imports: {imports_str}
+        # Per-type count vectors (CodeElementType declaration order) sum
+        # element-wise; count_by_type does the one flat walk per file
+        counts = [0] * len(_ELEMENT_SLOTS)
+        deps = set()
+        for file in dir_index.files:
+            for i, n in enumerate(file.count_by_type()):
+                counts[i] += n
 
-Code Elements:
-{chr(10).join(elements_desc)}
+            for imp in file.imports:
+                if '.' not in imp and imp not in ['os', 'sys', 'json', 're']:
+                    deps.add(imp)
 
-Provide ONE sentence describing the file's purpose and main functionality."""
+        # Persist the partial sum so index consumers can aggregate without
+        # walking element trees (this runs before the index file is written)
+        dir_index.element_counts = counts
 
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.3,
-                max_tokens=80
-            )
-            return response.choices[0].message.content.strip()
-        except Exception as e:
-            return f"Contains {len(file_metadata.elements)} code elements"
+        # Sibling directories are indexed in parallel, so merge under the lock
+        with self._stats_lock:
+            self._stats['directories'] += 1
+            self._stats['files'] += dir_index.direct_file_count
+            self._stats['lines'] += sum(f.total_lines for f in dir_index.files)
+            self._stats['classes'] += counts[_ELEMENT_SLOTS[CodeElementType.CLASS]]
+            self._stats['functions'] += counts[_ELEMENT_SLOTS[CodeElementType.FUNCTION]]
+            self._stats['methods'] += counts[_ELEMENT_SLOTS[CodeElementType.METHOD]]
+            self._stats['external_dependencies'] |= deps
+            self._stats['file_relative_paths'].extend(f.relative_path for f in dir_index.files)
+
+    def _calculate_statistics(self, repo_index: RepositoryIndex):
+        """Copy statistics accumulated during indexing into the repo index."""
+
+        repo_index.total_directories = self._stats['directories']
+        repo_index.total_files = self._stats['files']
+        repo_index.total_lines = self._stats['lines']
+        repo_index.total_classes = self._stats['classes']
+        repo_index.total_functions = self._stats['functions']
+        repo_index.total_methods = self._stats['methods']
+        repo_index.external_dependencies = sorted(self._stats['external_dependencies'])
     
-    def _generate_directory_summary(self, dir_index: DirectoryIndex) -> str:
-        """Generate LLM summary for a directory (bottom-up: aggregates file summaries)."""
-        
-        # Collect file summaries from this directory
+    def _directory_summary_inputs(self, dir_index: DirectoryIndex):
+        """Collect a directory's file and subdirectory summary lines for prompts."""
+
         file_summaries = []
         for file in dir_index.files[:10]:
             if file.summary:
                 file_summaries.append(f"- {file.relative_path}: {file.summary}")
-        
-        # Collect subdirectory summaries
+
         subdir_summaries = []
         for subdir in dir_index.subdirectories[:5]:
             if subdir.summary:
                 subdir_summaries.append(f"- {subdir.relative_path}/: {subdir.summary}")
-        
-        if not file_summaries and not subdir_summaries:
-            return f"Directory with {len(dir_index.files)} files"
-        
-        prompt = f"""Summarize this code directory in one concise sentence based on its contents:
 
-Directory: {dir_index.relative_path}
-Files: {len(dir_index.files)}
-Subdirectories: {len(dir_index.subdirectories)}
+        return file_summaries, subdir_summaries
+
+    def _batch_generate_directory_summaries(self, dir_indices: List[DirectoryIndex]) -> None:
+        """Fill summaries for sibling directories with one marshaled LLM call."""
+
+        # An unchanged subtree produces identical child summaries, so key each
+        # directory summary on them and serve cache hits without the LLM
+        pending = []
+        for dir_index in dir_indices:
+            file_summaries, subdir_summaries = self._directory_summary_inputs(dir_index)
+            if not file_summaries and not subdir_summaries:
+                dir_index.summary = f"Directory with {len(dir_index.files)} files"
+                continue
+            dir_key = hashlib.sha256(
+                '\n'.join([dir_index.relative_path] + file_summaries + subdir_summaries).encode()
+            ).hexdigest()
+            cached_summary = self.summary_cache.get(dir_key)
+            if cached_summary is not None:
+                dir_index.summary = cached_summary
+                continue
+            pending.append((dir_index, dir_key, file_summaries, subdir_summaries))
+
+        if not pending:
+            return
+
+        print(f"  🤖 Summarizing {len(pending)} directories in one call...")
+
+        rows = []
+        for idx, (dir_index, _, file_summaries, subdir_summaries) in enumerate(pending):
+            rows.append({
+                "idx": idx,
+                "path": dir_index.relative_path,
+                "file_summaries": file_summaries,
+                "subdirectory_summaries": subdir_summaries
+            })
 
-File Summaries:
-{chr(10).join(file_summaries) if file_summaries else '(no files)'}
+        prompt = f"""Summarize each of these code directories in ONE concise sentence describing what it contains and its purpose in the codebase.
 
-Subdirectory Summaries:
-{chr(10).join(subdir_summaries) if subdir_summaries else '(no subdirs)'}
+Directories (JSON):
+{_dumps_json(rows, indent=True)}
 
-Provide ONE sentence describing what this directory contains and its purpose in the codebase."""
+Return a JSON object of the form:
+{{"summaries": [{{"idx": 0, "summary": "<one sentence>"}}, ...]}}
+with exactly one entry per input directory, using each directory's "idx"."""
 
+        summaries = {}
         try:
-            response = self.client.chat.completions.create(
+            response = self._llm_call_with_retry(
                 model=self.model,
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.3,
-                max_tokens=100
+                max_tokens=100 * len(pending),
+                response_format={"type": "json_object"}
             )
-            return response.choices[0].message.content.strip()
-        except Exception as e:
-            return f"Directory with {len(dir_index.files)} files and {len(dir_index.subdirectories)} subdirectories"
+            data = _loads_json(response.choices[0].message.content)
+            summaries = {
+                int(item["idx"]): item["summary"].strip()
+                for item in data.get("summaries", [])
+                if isinstance(item, dict) and "idx" in item and item.get("summary")
+            }
+        except Exception:
+            summaries = {}
+
+        for idx, (dir_index, dir_key, _, _) in enumerate(pending):
+            summary = summaries.get(idx)
+            if summary:
+                dir_index.summary = summary
+                self.summary_cache.set(dir_key, summary)
+            else:
+                dir_index.summary = (
+                    f"Directory with {len(dir_index.files)} files "
+                    f"and {len(dir_index.subdirectories)} subdirectories"
+                )
     
     def _generate_repo_summary(self, repo_index: RepositoryIndex, root_index: DirectoryIndex) -> str:
         """Generate repository summary (bottom-up: aggregates directory summaries)."""
@@ -496,7 +1245,7 @@ Root Files:
 Provide a 2-3 sentence summary describing what this repository does and its main purpose."""
 
         try:
-            response = self.client.chat.completions.create(
+            response = self._llm_call_with_retry(
                 model=self.model,
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.3,
@@ -508,76 +1257,113 @@ Provide a 2-3 sentence summary describing what this repository does and its main
     
     def _generate_id(self, path: str) -> str:
         """Generate unique ID for a path."""
-        return hashlib.md5(path.encode()).hexdigest()[:12]
-    
-    def _hash_file(self, file_path: str) -> str:
-        """Generate hash for file content (for caching)."""
-        try:
-            with open(file_path, 'rb') as f:
-                return hashlib.md5(f.read()).hexdigest()
-        except Exception:
-            return hashlib.md5(file_path.encode()).hexdigest()
+        return hashlib.blake2b(path.encode(), digest_size=16).hexdigest()[:12]
     
     def _batch_generate_file_summaries(self, files: List[FileMetadata]) -> None:
-        """Generate summaries for multiple files in parallel."""
+        """Generate summaries for multiple files, marshaling several per LLM call."""
         if not files:
             return
-        
+
         # Filter files that need summaries
-        files_to_summarize = [f for f in files if not f.summary and hasattr(f, 'file_hash')]
-        
+        files_to_summarize = [f for f in files if not f.summary and f.file_hash]
+
         if not files_to_summarize:
             return
-        
-        print(f"  🚀 Generating {len(files_to_summarize)} file summaries in parallel...")
-        
-        def generate_one_summary(file_metadata: FileMetadata) -> tuple:
-            """Generate summary for one file."""
-            try:
-                summary = self._generate_file_summary_sync(file_metadata.file_path, file_metadata)
-                return (file_metadata.file_hash, summary, file_metadata)
-            except Exception as e:
-                return (file_metadata.file_hash, f"Contains {len(file_metadata.elements)} code elements", file_metadata)
-        
-        # Use ThreadPoolExecutor for parallel LLM calls
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            futures = {executor.submit(generate_one_summary, f): f for f in files_to_summarize}
-            
-            for future in as_completed(futures):
-                file_hash, summary, file_metadata = future.result()
+
+        print(f"  🚀 Generating {len(files_to_summarize)} file summaries "
+              f"(~{self.tokens_per_call} tokens per LLM call)...")
+
+        # Greedy-pack files into groups by estimated prompt tokens rather
+        # than a fixed row count: many small files share one call while a
+        # handful of huge ones don't blow past the context or rate budget.
+        # rows_per_call stays as a hard cap to bound the response size
+        groups = []
+        current, current_tokens = [], 0
+        for file_metadata in files_to_summarize:
+            row_tokens = _estimate_tokens(_dumps_json(self._file_summary_row(0, file_metadata)))
+            if current and (current_tokens + row_tokens > self.tokens_per_call
+                            or len(current) >= self.rows_per_call):
+                groups.append(current)
+                current, current_tokens = [], 0
+            current.append(file_metadata)
+            current_tokens += row_tokens
+        if current:
+            groups.append(current)
+
+        # Fan out the group requests on the async client; a semaphore holds
+        # concurrency at max_workers without pinning an OS thread per request
+        results = asyncio.run(self._agather_group_summaries(groups))
+
+        for group, summaries in zip(groups, results):
+            for idx, file_metadata in enumerate(group):
+                summary = summaries.get(idx) or f"Contains {len(file_metadata.elements)} code elements"
                 file_metadata.summary = summary
-                self.summary_cache[file_hash] = summary
-    
-    def _generate_file_summary_sync(self, file_path: str, file_metadata: FileMetadata) -> str:
-        """Generate LLM summary for a file (synchronous version for parallel execution)."""
-        
-        if not file_metadata.elements:
-            return f"Python file with {file_metadata.total_lines} lines"
-        
-        elements_desc = []
-        for element in file_metadata.elements[:10]:
-            if element.element_type == CodeElementType.CLASS:
-                elements_desc.append(f"- Class: {element.name} ({len(element.children)} methods)")
-            else:
-                elements_desc.append(f"- {element.element_type.value}: {element.name}")
-        
-        imports_str = ', '.join(file_metadata.imports[:5]) if file_metadata.imports else 'none'
-        
-        prompt = f"""Summarize this Python file in one concise sentence:
+                self.summary_cache.set(file_metadata.file_hash, summary)
+
+    async def _agather_group_summaries(self, groups: List[List[FileMetadata]]) -> List[dict]:
+        """Run all group summary requests concurrently, bounded by max_workers."""
+        semaphore = asyncio.Semaphore(self._concurrency)
 
-File: {file_metadata.relative_path}
-Lines: {file_metadata.total_lines}
-Imports: {imports_str}
+        async def run_group(group):
+            async with semaphore:
+                try:
+                    return await self._amarshal_group_summaries(group)
+                except Exception:
+                    return {}
 
-Code Elements:
-{chr(10).join(elements_desc)}
+        return await asyncio.gather(*(run_group(g) for g in groups))
 
-Provide ONE sentence describing the file's purpose and main functionality."""
+    async def _amarshal_group_summaries(self, group: List[FileMetadata]) -> dict:
+        """Request one-sentence summaries for a group of files in a single LLM call."""
 
-        response = self.client.chat.completions.create(
+        response = await self._allm_call_with_retry(
             model=self.model,
-            messages=[{"role": "user", "content": prompt}],
+            messages=[{"role": "user", "content": self._build_group_prompt(group)}],
             temperature=0.3,
-            max_tokens=80
+            max_tokens=100 * len(group),
+            response_format={"type": "json_object"}
         )
-        return response.choices[0].message.content.strip()
+        data = _loads_json(response.choices[0].message.content)
+
+        return {
+            int(item["idx"]): item["summary"].strip()
+            for item in data.get("summaries", [])
+            if isinstance(item, dict) and "idx" in item and item.get("summary")
+        }
+
+    def _file_summary_row(self, idx: int, file_metadata: FileMetadata) -> dict:
+        """Build one file's row for the marshaled summary prompt."""
+        return {
+            "idx": idx,
+            "path": file_metadata.relative_path,
+            "lines": file_metadata.total_lines,
+            "imports": file_metadata.imports[:5],
+            "elements": self._describe_elements(file_metadata)
+        }
+
+    def _build_group_prompt(self, group: List[FileMetadata]) -> str:
+        """Build the marshaled summary prompt for a group of files."""
+
+        rows = [
+            self._file_summary_row(idx, file_metadata)
+            for idx, file_metadata in enumerate(group)
+        ]
+
+        return f"""Summarize each of these Python files in ONE concise sentence describing its purpose and main functionality.
+
+Files (JSON):
+{_dumps_json(rows, indent=True)}
+
+Return a JSON object of the form:
+{{"summaries": [{{"idx": 0, "summary": "<one sentence>"}}, ...]}}
+with exactly one entry per input file, using each file's "idx"."""
+
+    def _describe_elements(self, file_metadata: FileMetadata) -> List[str]:
+        """Describe a file's top-level elements for summary prompts."""
+        elements_desc = []
+        for element in file_metadata.elements[:10]:
+            if element.element_type == CodeElementType.CLASS:
+                elements_desc.append(f"Class: {element.name} ({len(element.children)} methods)")
+            else:
+                elements_desc.append(f"{element.element_type.value}: {element.name}")
+        return elements_desc
@@ -3,12 +3,32 @@ Distributed Code Index Models
 Each directory has its own index file with references to subdirectory indices and code files.
 """
 
+import os
+import sys
+import gzip
+import json
+import mmap
+import time
+import asyncio
+import base64
+import hashlib
+
+from functools import cached_property
 from typing import List, Optional, Dict, Any
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr, field_serializer, field_validator
 from datetime import datetime
 from enum import Enum
 
 
+def _coerce_epoch_seconds(v):
+    """Accept epoch seconds, a datetime, or an ISO string (older indices)."""
+    if isinstance(v, datetime):
+        return int(v.timestamp())
+    if isinstance(v, str):
+        return int(datetime.fromisoformat(v).timestamp())
+    return v
+
+
 class CodeLanguage(str, Enum):
     """Supported programming languages."""
     PYTHON = "python"
@@ -28,6 +48,15 @@ class CodeElementType(str, Enum):
     METHOD = "method"
 
 
+# Wire form for the enums is the declaration-order ordinal: ints keep the
+# JSON parser on its fast integer path and shave bytes off every element.
+# Before-validators still accept the string values older indices contain
+_LANGUAGES = list(CodeLanguage)
+_LANGUAGE_ORDINAL = {lang: i for i, lang in enumerate(_LANGUAGES)}
+_ELEMENT_TYPES = list(CodeElementType)
+_ELEMENT_TYPE_ORDINAL = {t: i for i, t in enumerate(_ELEMENT_TYPES)}
+
+
 class CodeElementMetadata(BaseModel):
     """Lightweight metadata for a code element (no code content)."""
     name: str = Field(..., description="Element name")
@@ -41,6 +70,121 @@ class CodeElementMetadata(BaseModel):
     is_public: bool = Field(True, description="Whether element is public")
     children: List['CodeElementMetadata'] = Field(default_factory=list, description="Child elements (e.g., methods in a class)")
 
+    # Not frozen: the indexer backfills complexity and re-points file_path.
+    # Forbidding extras lets pydantic-core skip extra-field bookkeeping
+    model_config = ConfigDict(extra='forbid')
+
+    @field_serializer('element_type')
+    def _serialize_element_type(self, v: CodeElementType) -> int:
+        return _ELEMENT_TYPE_ORDINAL[v]
+
+    @field_validator('element_type', mode='before')
+    @classmethod
+    def _coerce_element_type(cls, v):
+        if isinstance(v, int):
+            return _ELEMENT_TYPES[v]
+        return v
+
+    @field_validator('file_path', mode='after')
+    @classmethod
+    def _intern_path(cls, v: str) -> str:
+        # Every element of a file repeats the same path; interning collapses
+        # the copies (across elements, files, and loads) to one shared object
+        return sys.intern(v)
+
+    @classmethod
+    def fast(cls, *, name: str, element_type: CodeElementType, file_path: str,
+             start_line: int, end_line: int, summary: Optional[str] = None,
+             signature: Optional[str] = None, complexity: Optional[int] = None,
+             is_public: bool = True,
+             children: Optional[List['CodeElementMetadata']] = None) -> 'CodeElementMetadata':
+        """
+        Build an element without validation, for the extractor's hot path.
+
+        Values straight out of the parser are correct by construction (a
+        real enum member, int line numbers), so model_construct can skip
+        pydantic-core validation; one element per function/class/method
+        makes this the most-constructed model in an indexing run. Since
+        validators don't run here, the file_path intern is applied by
+        hand. Untrusted input (JSON loads) keeps the validated constructor.
+        """
+        return cls.model_construct(
+            name=name,
+            element_type=element_type,
+            file_path=sys.intern(file_path),
+            start_line=start_line,
+            end_line=end_line,
+            summary=summary,
+            signature=signature,
+            complexity=complexity,
+            is_public=is_public,
+            children=children if children is not None else [],
+        )
+
+
+class ElementsSoA(BaseModel):
+    """
+    Columnar (struct-of-arrays) form of an element tree.
+
+    Parallel arrays make traversal linear and cache-friendly: statistics
+    passes iterate plain int lists instead of chasing nested model objects,
+    and the columnar JSON also compresses better. Row i's parent is
+    parent[i] (-1 for top-level elements), which encodes the tree flat.
+    """
+    names: List[str] = Field(default_factory=list, description="Element names")
+    types: List[int] = Field(default_factory=list, description="CodeElementType ordinals (declaration order)")
+    start_lines: List[int] = Field(default_factory=list, description="Starting line numbers")
+    end_lines: List[int] = Field(default_factory=list, description="Ending line numbers")
+    parent: List[int] = Field(default_factory=list, description="Parent row index, -1 for top level")
+    summaries: List[Optional[str]] = Field(default_factory=list, description="Element summaries")
+    signatures: List[Optional[str]] = Field(default_factory=list, description="Function/method signatures")
+    complexities: List[Optional[int]] = Field(default_factory=list, description="Cyclomatic complexities")
+    is_public: List[bool] = Field(default_factory=list, description="Public flags")
+
+    @classmethod
+    def from_elements(cls, elements: List['CodeElementMetadata']) -> 'ElementsSoA':
+        """Flatten a nested element tree into parallel columns."""
+        soa = cls()
+        stack = [(element, -1) for element in reversed(elements)]
+        while stack:
+            element, parent_idx = stack.pop()
+            row = len(soa.names)
+            soa.names.append(element.name)
+            soa.types.append(_ELEMENT_TYPE_ORDINAL[element.element_type])
+            soa.start_lines.append(element.start_line)
+            soa.end_lines.append(element.end_line)
+            soa.parent.append(parent_idx)
+            soa.summaries.append(element.summary)
+            soa.signatures.append(element.signature)
+            soa.complexities.append(element.complexity)
+            soa.is_public.append(element.is_public)
+            stack.extend((child, row) for child in reversed(element.children))
+        return soa
+
+    def to_elements(self, file_path: str) -> List['CodeElementMetadata']:
+        """Rebuild the nested element tree (all rows share one file path)."""
+        rows = [
+            CodeElementMetadata.fast(
+                name=self.names[i],
+                element_type=_ELEMENT_TYPES[self.types[i]],
+                file_path=file_path,
+                start_line=self.start_lines[i],
+                end_line=self.end_lines[i],
+                summary=self.summaries[i],
+                signature=self.signatures[i],
+                complexity=self.complexities[i],
+                is_public=self.is_public[i]
+            )
+            for i in range(len(self.names))
+        ]
+        top_level = []
+        for i, row in enumerate(rows):
+            if self.parent[i] == -1:
+                top_level.append(row)
+            else:
+                rows[self.parent[i]].children.append(row)
+        return top_level
+
 
 class FileMetadata(BaseModel):
     """Lightweight metadata for a source file (no code content)."""
@@ -52,7 +196,62 @@ class FileMetadata(BaseModel):
     elements: List[CodeElementMetadata] = Field(default_factory=list, description="Top-level code elements")
     imports: List[str] = Field(default_factory=list, description="Import statements")
     exports: List[str] = Field(default_factory=list, description="Exported symbols")
-    file_hash: Optional[str] = Field(None, description="Hash of file content for caching", exclude=True)
+    file_hash: Optional[bytes] = Field(None, description="Raw hash of file content for caching", exclude=True)
+
+    # Not frozen: summary and file_hash are assigned after construction
+    # during batch summarization
+    model_config = ConfigDict(extra='forbid')
+
+    @field_serializer('language')
+    def _serialize_language(self, v: CodeLanguage) -> int:
+        return _LANGUAGE_ORDINAL[v]
+
+    @field_validator('language', mode='before')
+    @classmethod
+    def _coerce_language(cls, v):
+        if isinstance(v, int):
+            return _LANGUAGES[v]
+        return v
+
+    @field_validator('file_hash', mode='before')
+    @classmethod
+    def _coerce_file_hash(cls, v):
+        # Raw digest bytes in memory (half the size of hex); hex strings
+        # from older callers are still accepted
+        if isinstance(v, str):
+            return bytes.fromhex(v)
+        return v
+
+    def elements_as_soa(self) -> ElementsSoA:
+        """Columnar view of this file's elements for linear stats passes."""
+        return ElementsSoA.from_elements(self.elements)
+
+    def count_by_type(self) -> List[int]:
+        """
+        Tally this file's elements by type, nested children included.
+
+        One count per CodeElementType in declaration order, so
+        counts[_ELEMENT_TYPE_ORDINAL[CodeElementType.CLASS]] is the class
+        count. An explicit stack flattens the children tree, and the
+        fixed-width vectors sum element-wise across files and directories
+        without any caller recursing over elements. (numpy.bincount would
+        vectorize the tally, but per-file element counts are far too small
+        to repay the dependency.)
+        """
+        counts = [0] * len(_ELEMENT_TYPES)
+        stack = list(self.elements)
+        while stack:
+            element = stack.pop()
+            counts[_ELEMENT_TYPE_ORDINAL[element.element_type]] += 1
+            if element.children:
+                stack.extend(element.children)
+        return counts
+
+    @field_validator('file_path', 'relative_path', mode='after')
+    @classmethod
+    def _intern_path(cls, v: str) -> str:
+        # Shared with the copies inside this file's elements
+        return sys.intern(v)
 
 
 class SubdirectoryReference(BaseModel):
@@ -65,6 +264,16 @@ class SubdirectoryReference(BaseModel):
     file_count: int = Field(0, description="Number of files in subdirectory (recursive)")
     subdir_count: int = Field(0, description="Number of subdirectories (recursive)")
 
+    # References are never mutated once built (summaries are filled in
+    # before construction), so instances can be frozen and shared freely
+    model_config = ConfigDict(frozen=True, extra='forbid')
+
+    @field_validator('dir_path', 'relative_path', mode='after')
+    @classmethod
+    def _intern_path(cls, v: str) -> str:
+        # Repeated in the child directory's own index; share one object
+        return sys.intern(v)
+
 
 class DirectoryIndex(BaseModel):
     """
@@ -93,22 +302,195 @@ class DirectoryIndex(BaseModel):
     direct_file_count: int = Field(0, description="Number of files directly in this directory")
     total_file_count: int = Field(0, description="Total files including subdirectories")
     total_lines: int = Field(0, description="Total lines of code including subdirectories")
+
+    # Per-type element tallies over this directory's direct files, one slot
+    # per CodeElementType in declaration order. Stored like an inner-node
+    # count: aggregate consumers sum these short vectors instead of walking
+    # element trees (and can pair with load_shallow, which keeps this field).
+    # Empty in indices written before the field existed
+    element_counts: List[int] = Field(default_factory=list, description="Element counts by type ordinal (direct files)")
     
-    # Metadata
-    indexed_at: datetime = Field(default_factory=datetime.now, description="When this directory was indexed")
-    
-    class Config:
-        json_encoders = {
-            datetime: lambda v: v.isoformat()
-        }
-    
+    # Metadata: Unix seconds serialize as a bare int, with no per-model
+    # datetime formatting on the hot dump path
+    indexed_at: int = Field(default_factory=lambda: int(time.time()), description="When this directory was indexed (Unix seconds)")
+
+    model_config = ConfigDict()
+
+    @field_validator('indexed_at', mode='before')
+    @classmethod
+    def _coerce_indexed_at(cls, v):
+        # Older indices stored an ISO timestamp
+        return _coerce_epoch_seconds(v)
+
+    @property
+    def indexed_at_dt(self) -> datetime:
+        """indexed_at as a datetime, for callers that want one."""
+        return datetime.fromtimestamp(self.indexed_at)
+
+    @field_validator('dir_path', 'relative_path', mode='after')
+    @classmethod
+    def _intern_path(cls, v: str) -> str:
+        # Repeated by the parent's SubdirectoryReference and by every file
+        return sys.intern(v)
+
+    def to_json_bytes(self) -> bytes:
+        """Serialize to JSON bytes directly from pydantic-core."""
+        return self.model_dump_json().encode()
+
+    @classmethod
+    def from_json_bytes(cls, data: bytes) -> 'DirectoryIndex':
+        """Deserialize from JSON bytes without an intermediate json.loads."""
+        return cls.model_validate_json(data)
+
+    @classmethod
+    def load(cls, path: str) -> 'DirectoryIndex':
+        """
+        Load an index file via mmap, skipping the str decode a text read
+        would do. The mapping is closed before returning, so no view of it
+        outlives this call.
+        """
+        with open(path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return cls.model_validate_json(bytes(mm))
+
+    @classmethod
+    def load_shallow(cls, path: str) -> 'DirectoryIndex':
+        """
+        Load an index file without its per-file element trees.
+
+        The elements dominate the payload in most index files, and callers
+        that only want counts, summaries or the directory fan-out pay for
+        validating every nested CodeElementMetadata they will never touch.
+        This drops each file's elements after the cheap json parse, so only
+        the file- and directory-level models get built; summaries, imports,
+        line counts and the subdirectory references all survive intact.
+        """
+        with open(path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                data = json.loads(bytes(mm))
+        for file_entry in data.get('files', ()):
+            file_entry['elements'] = []
+        return cls.model_validate(data)
+
+    def dump(self, path: str) -> bytes:
+        """
+        Write this index as JSON through an mmap'd destination.
+
+        The file is sized up front and the serialized bytes land in the
+        mapping with one slice assignment, letting the kernel absorb whole
+        pages instead of streaming them through the file object's buffer.
+        Returns the bytes written, for callers that also want the payload.
+        """
+        data = self.model_dump_json().encode()
+        # w+b: mapping for write requires a readable descriptor
+        with open(path, 'w+b') as f:
+            f.truncate(len(data))
+            with mmap.mmap(f.fileno(), len(data), access=mmap.ACCESS_WRITE) as mm:
+                mm[:] = data
+        return data
+
+    def compute_element_counts(self) -> List[int]:
+        """
+        Sum per-type element counts over this directory's direct files.
+
+        Prefers the stored element_counts partial sum; indices written
+        before that field existed fall back to tallying the files.
+        """
+        if self.element_counts:
+            return list(self.element_counts)
+        counts = [0] * len(_ELEMENT_TYPES)
+        for file in self.files:
+            for i, n in enumerate(file.count_by_type()):
+                counts[i] += n
+        return counts
+
+    def dump_compressed(self, path: str) -> bytes:
+        """
+        Write this index as gzip-compressed JSON.
+
+        Index JSON is highly repetitive (field names, shared path prefixes)
+        and typically compresses 5-10x, which matters when an index tree is
+        archived or shipped over the network. The per-directory index.json
+        files the agent navigates with cat/jq stay uncompressed; this is an
+        opt-in variant for cold storage. Returns the compressed bytes.
+        (gzip over zstd: stdlib, and these files are write-once/read-rarely,
+        so decompression speed is not the bottleneck.)
+        """
+        data = gzip.compress(self.model_dump_json().encode(), compresslevel=6)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return data
+
+    @classmethod
+    def load_compressed(cls, path: str) -> 'DirectoryIndex':
+        """Load an index written by dump_compressed."""
+        with open(path, 'rb') as f:
+            return cls.model_validate_json(gzip.decompress(f.read()))
+
+    # files/subdirectories are only mutated while a directory is being
+    # indexed; by the time anything asks for these views the lists are
+    # stable, so the caches never see a stale snapshot in practice
+
+    @cached_property
+    def file_paths(self) -> List[str]:
+        """File paths in this directory (direct children only)."""
+        return [f.file_path for f in self.files]
+
+    @cached_property
+    def subdirectory_index_paths(self) -> List[str]:
+        """Subdirectory index file paths."""
+        return [s.index_file_path for s in self.subdirectories]
+
     def get_file_paths(self) -> List[str]:
         """Get all file paths in this directory (direct children only)."""
-        return [f.file_path for f in self.files]
-    
+        return self.file_paths
+
     def get_subdirectory_index_paths(self) -> List[str]:
         """Get all subdirectory index file paths."""
-        return [s.index_file_path for s in self.subdirectories]
+        return self.subdirectory_index_paths
+
+    def load_children(self) -> List['DirectoryIndex']:
+        """
+        Load every child directory index.
+
+        A posix_fadvise(WILLNEED) pass over the whole fan-out first asks the
+        kernel to start readahead for all child files, so on a cold cache the
+        disk reads overlap instead of serializing one open-read at a time;
+        the subsequent loads then mostly hit cached pages.
+        """
+        paths = self.get_subdirectory_index_paths()
+
+        if hasattr(os, 'posix_fadvise'):
+            for path in paths:
+                try:
+                    fd = os.open(path, os.O_RDONLY)
+                    try:
+                        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+                    finally:
+                        os.close(fd)
+                except OSError:
+                    continue
+
+        return [DirectoryIndex.load(path) for path in paths]
+
+    async def aload_children(self) -> List['DirectoryIndex']:
+        """
+        Load every child directory index concurrently.
+
+        Each child's read+validate runs on the default executor and the
+        results gather in listing order: the reads overlap in the OS while
+        validation stays off the event loop. (An async file library would
+        only add a dependency for the same threadpool-backed reads.)
+        """
+        loop = asyncio.get_running_loop()
+        return list(await asyncio.gather(*(
+            loop.run_in_executor(None, DirectoryIndex.load, path)
+            for path in self.get_subdirectory_index_paths()
+        )))
+
+    def load_children_parallel(self) -> List['DirectoryIndex']:
+        """Synchronous wrapper around aload_children."""
+        return asyncio.run(self.aload_children())
 
 
 class RepositoryIndex(BaseModel):
@@ -141,17 +523,130 @@ class RepositoryIndex(BaseModel):
     # Quick lookup
     entry_points: List[str] = Field(default_factory=list, description="Entry point files")
     external_dependencies: List[str] = Field(default_factory=list, description="External dependencies")
+
+    # Bloom filter over file relative paths: a negative might_contain answer
+    # is definitive, so misses never touch any directory index file
+    path_bloom: Optional[str] = Field(None, description="Base64 Bloom filter over file relative paths")
+    bloom_bits: int = Field(0, description="Bloom filter size in bits")
+    bloom_k: int = Field(0, description="Number of Bloom hash functions")
     
-    # Metadata
-    indexed_at: datetime = Field(default_factory=datetime.now, description="When index was created")
-    
-    class Config:
-        json_encoders = {
-            datetime: lambda v: v.isoformat()
-        }
-    
-    def get_statistics(self) -> Dict[str, Any]:
-        """Get repository statistics."""
+    # Metadata: Unix seconds serialize as a bare int, with no per-model
+    # datetime formatting on the hot dump path
+    indexed_at: int = Field(default_factory=lambda: int(time.time()), description="When index was created (Unix seconds)")
+
+    model_config = ConfigDict()
+
+    @field_validator('indexed_at', mode='before')
+    @classmethod
+    def _coerce_indexed_at(cls, v):
+        # Older indices stored an ISO timestamp
+        return _coerce_epoch_seconds(v)
+
+    @property
+    def indexed_at_dt(self) -> datetime:
+        """indexed_at as a datetime, for callers that want one."""
+        return datetime.fromtimestamp(self.indexed_at)
+
+    # Decoded filter bitmap, cached on first might_contain call
+    _bloom_bitmap: Optional[bytes] = PrivateAttr(default=None)
+
+    # Flat relative_path -> FileMetadata table, built on first find_file
+    _path_index: Optional[Dict[str, FileMetadata]] = PrivateAttr(default=None)
+
+    def build_path_index(self) -> None:
+        """
+        Build the flat path lookup table by walking the directory indices
+        once from the root. Subsequent lookups are a single dict probe
+        instead of a top-down descent parsing one index file per level.
+        """
+        index: Dict[str, FileMetadata] = {}
+        stack = [self.root_index_path]
+        while stack:
+            dir_index = DirectoryIndex.load(stack.pop())
+            for file in dir_index.files:
+                index[file.relative_path] = file
+            stack.extend(dir_index.get_subdirectory_index_paths())
+        self._path_index = index
+
+    def find_file(self, relative_path: str) -> Optional[FileMetadata]:
+        """Look up an indexed file by its relative path, or None."""
+        # The Bloom filter settles definite misses without touching disk
+        # or forcing the table build
+        if self.path_bloom and not self.might_contain(relative_path):
+            return None
+        if self._path_index is None:
+            self.build_path_index()
+        return self._path_index.get(relative_path)
+
+    @staticmethod
+    def _bloom_positions(path: str, bits: int, k: int):
+        """Yield k bit positions for a path via double hashing."""
+        digest = hashlib.blake2b(path.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(k):
+            yield (h1 + i * h2) % bits
+
+    def build_path_bloom(self, relative_paths: List[str], bits_per_path: int = 10) -> None:
+        """Build the path filter (~1% false positives at 10 bits/path, k=7)."""
+        if not relative_paths:
+            self.path_bloom = None
+            self.bloom_bits = 0
+            self.bloom_k = 0
+            return
+
+        bits = max(64, bits_per_path * len(relative_paths))
+        k = 7
+        bitmap = bytearray((bits + 7) // 8)
+        for path in relative_paths:
+            for pos in self._bloom_positions(path, bits, k):
+                bitmap[pos >> 3] |= 1 << (pos & 7)
+
+        self.path_bloom = base64.b64encode(bytes(bitmap)).decode('ascii')
+        self.bloom_bits = bits
+        self.bloom_k = k
+        self._bloom_bitmap = bytes(bitmap)
+
+    def might_contain(self, relative_path: str) -> bool:
+        """
+        Whether a file path might be in the index.
+
+        False is definitive (no directory index needs reading); True means
+        "possibly present" and callers proceed to the real lookup. Indices
+        without a filter conservatively answer True for everything.
+        """
+        if not self.path_bloom or not self.bloom_bits:
+            return True
+        if self._bloom_bitmap is None:
+            self._bloom_bitmap = base64.b64decode(self.path_bloom)
+        for pos in self._bloom_positions(relative_path, self.bloom_bits, self.bloom_k):
+            if not self._bloom_bitmap[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def to_json_bytes(self) -> bytes:
+        """Serialize to JSON bytes directly from pydantic-core."""
+        return self.model_dump_json().encode()
+
+    @classmethod
+    def from_json_bytes(cls, data: bytes) -> 'RepositoryIndex':
+        """Deserialize from JSON bytes without an intermediate json.loads."""
+        return cls.model_validate_json(data)
+
+    @classmethod
+    def load(cls, path: str) -> 'RepositoryIndex':
+        """
+        Load an index file via mmap, skipping the str decode a text read
+        would do. The mapping is closed before returning, so no view of it
+        outlives this call.
+        """
+        with open(path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return cls.model_validate_json(bytes(mm))
+
+    @cached_property
+    def statistics(self) -> Dict[str, Any]:
+        """Repository statistics (built once; counts are stable after indexing)."""
         return {
             "total_files": self.total_files,
             "total_lines": self.total_lines,
@@ -163,3 +658,7 @@ class RepositoryIndex(BaseModel):
             "external_dependencies": len(self.external_dependencies),
             "entry_points": len(self.entry_points)
         }
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """Get repository statistics."""
+        return self.statistics